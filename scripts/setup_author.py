@@ -1,10 +1,12 @@
 import argparse
-import json
 
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 
 from slavoj.core.config import ConfigLoader
 from slavoj.core.logging import LoggerFactory
+from slavoj.utils.event_loop import run
+from slavoj.utils.mongodb import create_client, ensure_indexes
+from slavoj.utils.serialization import load_json_file
 
 logger = LoggerFactory.create_logger("AuthorSetup")
 
@@ -26,14 +28,14 @@ async def setup_author(
         whatsapp_number: WhatsApp number for the author
         metadata_file: Path to JSON metadata file
     """
+    client = None
     try:
         # Initialize MongoDB client
-        client = AsyncIOMotorClient(mongodb_uri)
+        client = create_client(mongodb_uri)
         db = client[database]
 
         # Load author metadata
-        with open(metadata_file, 'r') as f:
-            metadata = json.load(f)
+        metadata = load_json_file(metadata_file)
 
         # Set up author document
         author_doc = {
@@ -44,21 +46,24 @@ async def setup_author(
             "metadata": metadata.get("author_metadata", {})
         }
 
-        # Check if WhatsApp number is already in use by another author
-        existing_author = await db.authors.find_one(
-            {"whatsapp_number": whatsapp_number, "name": {"$ne": author}}
-        )
-        if existing_author:
-            logger.error(
-                f"WhatsApp number {whatsapp_number} is already in use by author: {existing_author['name']}")
-            return False
+        # A WhatsApp number can only belong to one author, enforced by MongoDB
+        await ensure_indexes(db, ["authors"])
 
         # Insert or update author
-        result = await db.authors.update_one(
-            {"name": author},
-            {"$set": author_doc},
-            upsert=True
-        )
+        try:
+            result = await db.authors.update_one(
+                {"name": author},
+                {"$set": author_doc},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            existing_author = await db.authors.find_one(
+                {"whatsapp_number": whatsapp_number}, {"_id": 0, "name": 1}
+            )
+            owner = existing_author["name"] if existing_author else "unknown"
+            logger.error(
+                f"WhatsApp number {whatsapp_number} is already in use by author: {owner}")
+            return False
 
         if result.modified_count > 0:
             logger.info(f"Updated existing author: {author}")
@@ -70,6 +75,9 @@ async def setup_author(
     except Exception as e:
         logger.error(f"Error setting up author: {e}")
         return False
+    finally:
+        if client is not None:
+            client.close()
 
 
 def main():
@@ -95,8 +103,7 @@ def main():
     config = config_loader.load_config()
 
     # Run setup
-    import asyncio
-    success = asyncio.run(setup_author(
+    success = run(setup_author(
         mongodb_uri=config.mongodb.connection_string,
         database=config.mongodb.database,
         author=args.author,
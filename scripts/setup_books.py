@@ -1,23 +1,75 @@
 import argparse
-import json
+import asyncio
+import contextlib
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
-from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from slavoj.core.config import ConfigLoader
 from slavoj.core.logging import LoggerFactory
+from slavoj.utils.event_loop import run
+from slavoj.utils.mongodb import BOOK_CONTENT_BUCKET, create_client, ensure_indexes
 from slavoj.utils.pdf import extract_text_from_pdf
+from slavoj.utils.serialization import load_json_object
 
 logger = LoggerFactory.create_logger("BooksSetup")
 
+# Maximum number of upserts sent to MongoDB in a single bulk_write call
+BULK_WRITE_BATCH_SIZE = 500
+
+# Connection pool bounds for the setup run
+MIN_POOL_SIZE = 8
+MAX_POOL_SIZE = 32
+
+
+async def remove_unreferenced_content(
+        db: AsyncIOMotorDatabase,
+        content_fs: AsyncIOMotorGridFSBucket,
+        content_ids: List[ObjectId]
+) -> None:
+    """
+    Delete uploaded book text that no book document references.
+
+    Args:
+        db: Database holding the books collection
+        content_fs: GridFS bucket the text was uploaded to
+        content_ids: IDs of the uploaded files to check
+    """
+    if not content_ids:
+        return
+
+    try:
+        referenced = {
+            doc["content_id"]
+            async for doc in db.books.find(
+                {"content_id": {"$in": content_ids}},
+                {"_id": 0, "content_id": 1}
+            )
+        }
+        for content_id in content_ids:
+            if content_id not in referenced:
+                await content_fs.delete(content_id)
+                logger.info(f"Removed unreferenced content {content_id}")
+    except Exception as e:
+        logger.error(f"Failed to remove unreferenced content {content_ids}: {e}")
+
 
 async def setup_books(
         mongodb_uri: str,
         database: str,
         author: str,
         books_dir: str,
-        metadata_file: Optional[str] = None
+        metadata_file: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        parallel_pages: bool = False
 ) -> bool:
     """
     Set up books for an author in the MongoDB database.
@@ -28,14 +80,25 @@ async def setup_books(
         author: Author name
         books_dir: Directory containing book PDFs
         metadata_file: Optional path to JSON metadata file with book metadata
+        max_workers: Number of processes used for PDF extraction
+        parallel_pages: Extract one PDF at a time split into page ranges
+            across the processes, rather than one PDF per process. Faster
+            when a few large PDFs make up most of the pages.
     """
+    client = None
     try:
         # Initialize MongoDB client
-        client = AsyncIOMotorClient(mongodb_uri)
+        client = create_client(
+            mongodb_uri, minPoolSize=MIN_POOL_SIZE, maxPoolSize=MAX_POOL_SIZE
+        )
         db = client[database]
 
+        # Force server discovery now so the pool fills while PDFs are parsed
+        # rather than on the first write
+        await client.admin.command("ping")
+
         # Verify author exists
-        author_doc = await db.authors.find_one({"name": author})
+        author_doc = await db.authors.find_one({"name": author}, {"_id": 1})
         if not author_doc:
             logger.error(f"Author {author} not found in database")
             return False
@@ -43,9 +106,7 @@ async def setup_books(
         # Load book metadata if provided
         book_metadata = {}
         if metadata_file:
-            with open(metadata_file, 'r') as f:
-                metadata = json.load(f)
-                book_metadata = metadata.get("books", {})
+            book_metadata = load_json_object(metadata_file, "books")
 
         # Process books
         books_path = Path(books_dir)
@@ -55,41 +116,140 @@ async def setup_books(
             logger.error(f"No PDF files found in {books_dir}")
             return False
 
-        success_count = 0
-        for pdf_file in pdf_files:
+        # Book text is stored in GridFS, remember the files currently
+        # referenced so they can be removed once replaced
+        content_fs = AsyncIOMotorGridFSBucket(db, bucket_name=BOOK_CONTENT_BUCKET)
+        previous_content_ids = {
+            doc["title"]: doc["content_id"]
+            async for doc in db.books.find(
+                {"author": author, "content_id": {"$exists": True}},
+                {"_id": 0, "title": 1, "content_id": 1}
+            )
+        }
+
+        # Text uploaded by this run and the books whose upsert succeeded, the
+        # text of any other book is removed again unless a document uses it
+        uploaded_ids: Dict[str, ObjectId] = {}
+        written_titles: Set[str] = set()
+
+        # Extract text from PDFs in parallel, parsing is CPU bound so a process
+        # pool is used rather than threads. The semaphore bounds how many
+        # extractions are in flight so results are turned into upserts as soon
+        # as they complete instead of all being queued on the pool up front.
+        # With parallel_pages each extraction starts its own pool over the
+        # pages of the PDF, so only one runs at a time.
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(
+            1 if parallel_pages else max_workers or os.cpu_count() or 1
+        )
+
+        async def prepare_book(pdf_file: Path) -> Optional[Tuple[str, UpdateOne]]:
+            """Extract a PDF and build the upsert for its book document"""
             book_title = pdf_file.stem
 
-            # Extract text content
-            content = extract_text_from_pdf(str(pdf_file))
+            # Without parallel_pages each PDF is already extracted in its own
+            # pool process, so the extraction itself runs in-process rather
+            # than starting a pool. With it the extraction waits on its page
+            # pool from a thread.
+            async with semaphore:
+                content = await loop.run_in_executor(
+                    pool,
+                    functools.partial(
+                        extract_text_from_pdf, str(pdf_file),
+                        max_workers=max_workers if parallel_pages else 1
+                    )
+                )
+
             if not content:
                 logger.error(f"Failed to extract content from {pdf_file}")
-                continue
+                return None
 
             # Get book metadata if available
             metadata = book_metadata.get(book_title, {})
 
+            # Store the text in GridFS, a full book can exceed the 16MB
+            # document limit and would otherwise be read with every book query
+            content_id = await content_fs.upload_from_stream(
+                book_title,
+                content.encode("utf-8"),
+                metadata={"author": author}
+            )
+            uploaded_ids[book_title] = content_id
+
             # Create book document
             book_doc = {
                 "title": book_title,
-                "content": content,
+                "content_id": content_id,
                 "author": author,
                 "publication_year": metadata.get("publication_year"),
                 "metadata": metadata.get("metadata", {})
             }
 
-            # Insert or update book
-            result = await db.books.update_one(
+            return book_title, UpdateOne(
                 {"title": book_title, "author": author},
-                {"$set": book_doc},
+                # Drop any inline content written before GridFS was used
+                {"$set": book_doc, "$unset": {"content": ""}},
                 upsert=True
             )
 
-            if result.modified_count > 0:
-                logger.info(f"Updated existing book: {book_title}")
-                success_count += 1
-            elif result.upserted_id:
-                logger.info(f"Created new book: {book_title}")
-                success_count += 1
+        success_count = 0
+        try:
+            pool = None if parallel_pages else ProcessPoolExecutor(
+                max_workers=max_workers)
+            with pool or contextlib.nullcontext():
+                results = await asyncio.gather(
+                    *[prepare_book(pdf_file) for pdf_file in pdf_files]
+                )
+            prepared = [result for result in results if result is not None]
+
+            # The upserts filter on author and title, served by the
+            # author_title index the application also uses
+            await ensure_indexes(db, ["books"])
+
+            # Insert or update books, unordered so one failure doesn't stop
+            # the rest
+            for i in range(0, len(prepared), BULK_WRITE_BATCH_SIZE):
+                batch = prepared[i:i + BULK_WRITE_BATCH_SIZE]
+                failed = set()
+                try:
+                    result = await db.books.bulk_write(
+                        [op for _, op in batch], ordered=False
+                    )
+                    counts = result.bulk_api_result
+                except BulkWriteError as e:
+                    # The upserts without an error were still written
+                    counts = e.details
+                    failed = {error["index"] for error in counts["writeErrors"]}
+                    for error in counts["writeErrors"]:
+                        logger.error(
+                            f"Failed to write {batch[error['index']][0]}: "
+                            f"{error.get('errmsg')}")
+
+                written_titles.update(
+                    title for j, (title, _) in enumerate(batch) if j not in failed
+                )
+                success_count += counts["nModified"] + counts["nUpserted"]
+                logger.info(
+                    f"Wrote book batch: {counts['nUpserted']} created, "
+                    f"{counts['nModified']} updated")
+        finally:
+            # Uploads whose upsert failed or never ran would otherwise stay
+            # in GridFS unreferenced
+            await remove_unreferenced_content(
+                db, content_fs,
+                [content_id for title, content_id in uploaded_ids.items()
+                 if title not in written_titles]
+            )
+
+        # Remove the text of books that have just been replaced
+        for book_title in written_titles:
+            previous_id = previous_content_ids.get(book_title)
+            if previous_id is None:
+                continue
+            try:
+                await content_fs.delete(previous_id)
+            except NoFile:
+                logger.warning(f"Previous content {previous_id} already removed")
 
         logger.info(
             f"Successfully processed {success_count} out of {len(pdf_files)} books")
@@ -98,6 +258,9 @@ async def setup_books(
     except Exception as e:
         logger.error(f"Error setting up books: {e}")
         return False
+    finally:
+        if client is not None:
+            client.close()
 
 
 def main():
@@ -109,6 +272,9 @@ def main():
     parser.add_argument("--metadata", help="Path to JSON metadata file")
     parser.add_argument("--config", help="Path to config file",
                         default="config.dev.yaml")
+    parser.add_argument("--parallel-pages", action="store_true",
+                        help="Extract each PDF across all workers by page "
+                             "range, for a few large PDFs")
 
     args = parser.parse_args()
 
@@ -117,13 +283,14 @@ def main():
     config = config_loader.load_config()
 
     # Run setup
-    import asyncio
-    success = asyncio.run(setup_books(
+    success = run(setup_books(
         mongodb_uri=config.mongodb.connection_string,
         database=config.mongodb.database,
         author=args.author,
         books_dir=args.books_dir,
-        metadata_file=args.metadata
+        metadata_file=args.metadata,
+        max_workers=config.processing.max_concurrent_books,
+        parallel_pages=args.parallel_pages
     ))
 
     if success:
@@ -1,10 +1,14 @@
+import functools
 import os
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional
 
 import yaml
 
+# Use the libyaml backed loader when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 @dataclass
 class TwilioConfig:
@@ -20,6 +24,8 @@ class LLMConfig:
     model: str
     max_tokens: int
     temperature: float
+    # Output token limit of the model, looked up from the provider when unset
+    max_output_tokens: Optional[int] = None
 
 
 @dataclass
@@ -45,6 +51,13 @@ class AppConfig:
     log_level: str
 
 
+@functools.lru_cache(maxsize=4)
+def _read_config_file(config_path: str, modified_time: float) -> Dict[str, Any]:
+    """Parse a YAML config file, cached until the file is modified"""
+    with open(config_path, "r") as f:
+        return yaml.load(f, Loader=_YAML_LOADER)
+
+
 class ConfigLoader:
     def __init__(self, config_path: Optional[str] = None):
         self.config_path = config_path or os.getenv("CONFIG_PATH")
@@ -54,55 +67,59 @@ class ConfigLoader:
         if not Path(self.config_path).exists():
             raise FileNotFoundError(f"Config file not found: {self.config_path}")
 
-        with open(self.config_path, "r") as f:
-            config_data = yaml.safe_load(f)
+        config_data = _read_config_file(
+            self.config_path, os.path.getmtime(self.config_path)
+        )
+        env = os.environ
 
         # Load configurations with environment variable fallbacks
         twilio_config = TwilioConfig(
-            account_sid=os.getenv(
+            account_sid=env.get(
                 "TWILIO_ACCOUNT_SID", config_data["twilio"]["account_sid"]
             ),
-            auth_token=os.getenv(
+            auth_token=env.get(
                 "TWILIO_AUTH_TOKEN", config_data["twilio"]["auth_token"]
             ),
-            phone_number=os.getenv(
+            phone_number=env.get(
                 "TWILIO_PHONE_NUMBER", config_data["twilio"]["phone_number"]
             ),
         )
 
+        max_output_tokens = env.get(
+            "LLM_MAX_OUTPUT_TOKENS", config_data["llm"].get("max_output_tokens")
+        )
         llm_config = LLMConfig(
-            provider=os.getenv("LLM_PROVIDER", config_data["llm"]["provider"]),
-            api_key=os.getenv("LLM_API_KEY", config_data["llm"]["api_key"]),
-            model=os.getenv("LLM_MODEL", config_data["llm"]["model"]),
-            max_tokens=int(
-                os.getenv("LLM_MAX_TOKENS", config_data["llm"]["max_tokens"])
-            ),
+            provider=env.get("LLM_PROVIDER", config_data["llm"]["provider"]),
+            api_key=env.get("LLM_API_KEY", config_data["llm"]["api_key"]),
+            model=env.get("LLM_MODEL", config_data["llm"]["model"]),
+            max_tokens=int(env.get("LLM_MAX_TOKENS", config_data["llm"]["max_tokens"])),
             temperature=float(
-                os.getenv("LLM_TEMPERATURE", config_data["llm"]["temperature"])
+                env.get("LLM_TEMPERATURE", config_data["llm"]["temperature"])
             ),
+            max_output_tokens=int(max_output_tokens) if max_output_tokens else None,
         )
 
         mongodb_config = MongoDBConfig(
-            connection_string=os.getenv(
+            connection_string=env.get(
                 "MONGODB_CONNECTION_STRING", config_data["mongodb"]["connection_string"]
             ),
-            database=os.getenv("MONGODB_DATABASE", config_data["mongodb"]["database"]),
+            database=env.get("MONGODB_DATABASE", config_data["mongodb"]["database"]),
         )
 
         processing_config = ProcessingConfig(
             max_concurrent_books=int(
-                os.getenv(
+                env.get(
                     "MAX_CONCURRENT_BOOKS",
                     config_data["processing"]["max_concurrent_books"],
                 )
             ),
             response_timeout=int(
-                os.getenv(
+                env.get(
                     "RESPONSE_TIMEOUT", config_data["processing"]["response_timeout"]
                 )
             ),
             aggregation_timeout=int(
-                os.getenv(
+                env.get(
                     "AGGREGATION_TIMEOUT",
                     config_data["processing"]["aggregation_timeout"],
                 )
@@ -114,6 +131,6 @@ class ConfigLoader:
             llm=llm_config,
             mongodb=mongodb_config,
             processing=processing_config,
-            environment=os.getenv("APP_ENVIRONMENT", "development"),
-            log_level=os.getenv("LOG_LEVEL", "INFO"),
+            environment=env.get("APP_ENVIRONMENT", "development"),
+            log_level=env.get("LOG_LEVEL", "INFO"),
         )
@@ -1,55 +1,64 @@
 class BaseError(Exception):
     """Base error class for the application."""
 
+    # Storing the attributes in slots means the exception's __dict__ is
+    # never materialised
+    __slots__ = ("message", "error_code")
+
     def __init__(self, message: str, error_code: str = None):
         self.message = message
         self.error_code = error_code
         super().__init__(self.message)
 
+    def __reduce__(self):
+        # Slots aren't pickled by Exception's default reduce, rebuild the
+        # error from its attributes so error_code survives process boundaries
+        return type(self), (self.message, self.error_code)
+
 
 class ConfigurationError(BaseError):
     """Raised when there are configuration-related errors."""
 
-    pass
+    __slots__ = ()
 
 
 class DatabaseError(BaseError):
     """Raised when database operations fail."""
 
-    pass
+    __slots__ = ()
 
 
 class MessageDeliveryError(BaseError):
     """Raised when message delivery fails."""
 
-    pass
+    __slots__ = ()
 
 
 class LLMError(BaseError):
     """Raised when LLM operations fail."""
 
-    pass
+    __slots__ = ()
 
 
 class BookProcessingError(BaseError):
     """Raised when book processing fails."""
 
-    pass
+    __slots__ = ()
 
 
 class ResponseAggregationError(BaseError):
     """Raised when response aggregation fails."""
 
-    pass
+    __slots__ = ()
 
 
 class ConversationError(BaseError):
     """Raised when conversation processing fails."""
 
-    pass
+    __slots__ = ()
 
 
 class AuthenticationError(BaseError):
     """Raised when authentication fails."""
 
-    pass
+    __slots__ = ()
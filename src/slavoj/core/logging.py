@@ -1,17 +1,25 @@
-import json
+import atexit
 import logging
+import queue
 import sys
-from datetime import datetime
-from logging.handlers import RotatingFileHandler
-from typing import Optional
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+from slavoj.utils.serialization import dump_json
 
 
 class JSONFormatter(logging.Formatter):
     """Custom JSON formatter for structured logging."""
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (epoch second, formatted prefix) of the most recently seen second
+        self._second_cache = (None, "")
+
     def format(self, record):
         log_record = {
-            "timestamp": datetime.utcfromtimestamp(record.created).isoformat(),
+            "timestamp": self._format_timestamp(record.created),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -20,13 +28,67 @@ class JSONFormatter(logging.Formatter):
             "line": record.lineno,
         }
 
-        if hasattr(record, "props"):
-            log_record.update(record.props)
+        props = getattr(record, "props", None)
+        if props:
+            log_record.update(props)
 
         if record.exc_info:
-            log_record["exception"] = self.formatException(record.exc_info)
+            # Cache the formatted traceback on the record, as logging.Formatter
+            # does, so it is only rendered once when several handlers emit it
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+            log_record["exception"] = record.exc_text
+
+        return dump_json(log_record)
+
+    def _format_timestamp(self, created: float) -> str:
+        """Format a record's creation time as an ISO 8601 UTC timestamp"""
+        # Records arrive in bursts, so the date and time up to the second is
+        # usually the same as for the previous record and can be reused
+        second = int(created)
+        cached_second, prefix = self._second_cache
+        if second != cached_second:
+            prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+            self._second_cache = (second, prefix)
+
+        microseconds = min(round((created - second) * 1_000_000), 999_999)
+        return f"{prefix}.{microseconds:06d}"
+
+
+# Formatters hold no per-record state, so one instance is shared by all loggers
+_JSON_FORMATTER = JSONFormatter()
+_TEXT_FORMATTER = logging.Formatter(
+    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Loggers already configured by the factory, keyed by name
+_LOGGERS: Dict[str, logging.Logger] = {}
 
-        return json.dumps(log_record)
+# Queues drained to log files by a background listener thread, keyed by path
+_FILE_QUEUES: Dict[str, queue.Queue] = {}
+
+
+def _get_file_queue(log_file: str, max_bytes: int, backup_count: int) -> queue.Queue:
+    """
+    Get the queue feeding a log file, starting its listener on first use.
+
+    Records are formatted before they are queued, so the file handler only
+    writes the pre-formatted message.
+    """
+    if log_file not in _FILE_QUEUES:
+        log_queue = queue.Queue(-1)
+        file_handler = RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count
+        )
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+
+        listener = QueueListener(log_queue, file_handler)
+        listener.start()
+        atexit.register(listener.stop)
+
+        _FILE_QUEUES[log_file] = log_queue
+
+    return _FILE_QUEUES[log_file]
 
 
 class LoggerFactory:
@@ -52,35 +114,35 @@ class LoggerFactory:
             backup_count: Number of backup files to keep
             json_format: Whether to use JSON formatting
         """
+        if name in _LOGGERS:
+            return _LOGGERS[name]
+
         logger = logging.getLogger(name)
 
         # Prevent adding handlers multiple times
         if logger.handlers:
+            _LOGGERS[name] = logger
             return logger
 
         logger.setLevel(getattr(logging, level.upper()))
 
-        # Create formatters
-        if json_format:
-            formatter = JSONFormatter()
-        else:
-            formatter = logging.Formatter(
-                "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            )
+        formatter = _JSON_FORMATTER if json_format else _TEXT_FORMATTER
 
         # Console handler
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setFormatter(formatter)
         logger.addHandler(console_handler)
 
-        # File handler (if log_file specified)
+        # File handler (if log_file specified), writes happen on a listener
+        # thread so logging calls never block on disk I/O or rotation
         if log_file:
-            file_handler = RotatingFileHandler(
-                log_file, maxBytes=max_bytes, backupCount=backup_count
+            queue_handler = QueueHandler(
+                _get_file_queue(log_file, max_bytes, backup_count)
             )
-            file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
+            queue_handler.setFormatter(formatter)
+            logger.addHandler(queue_handler)
 
+        _LOGGERS[name] = logger
         return logger
 
     @staticmethod
@@ -8,7 +8,7 @@ class MessagingInterface(ABC):
     """Interface for messaging service implementations"""
 
     @abstractmethod
-    def send_message(self, message: Message) -> bool:
+    async def send_message(self, message: Message) -> bool:
         """Send a message through the messaging service"""
         pass
 
@@ -33,6 +33,25 @@ class LLMInterface(ABC):
         """Generate a response based on book content and conversation context"""
         pass
 
+    @abstractmethod
+    async def generate_responses_batch(
+        self, books: List[Book], conversation_context: ConversationContext, query: str
+    ) -> List[GeneratedResponse]:
+        """Generate a response for each of several books in a single request"""
+        pass
+
+    @abstractmethod
+    def max_batch_size(self) -> int:
+        """Maximum number of books answered by one generate_responses_batch call"""
+        pass
+
+    @abstractmethod
+    async def generate_small_talk(
+        self, conversation_context: ConversationContext, query: str
+    ) -> str:
+        """Generate a brief reply to a message that needs no book content"""
+        pass
+
     @abstractmethod
     async def aggregate_responses(
         self, responses: List[GeneratedResponse], query: str
@@ -73,7 +92,7 @@ class DatabaseInterface(ABC):
 
     @abstractmethod
     async def store_conversation(self, conversation: ConversationContext) -> bool:
-        """Store conversation context"""
+        """Store conversation context, False if one with its id already exists"""
         pass
 
     @abstractmethod
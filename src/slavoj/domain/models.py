@@ -1,7 +1,11 @@
+import sys
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+# Slotted dataclasses avoid a per-instance __dict__, slots=True needs 3.10+
+DATACLASS_OPTIONS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
 
 class MessageType(Enum):
@@ -12,7 +16,7 @@ class MessageType(Enum):
     SYSTEM = "system"
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class Message:
     """Represents a single message in a conversation"""
 
@@ -22,7 +26,14 @@ class Message:
     recipient_id: str
     conversation_id: str
     message_type: MessageType
-    metadata: Dict[str, any] = field(default_factory=dict)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        # The same few IDs repeat across every message of a conversation,
+        # interning lets all messages share a single copy of each
+        self.sender_id = sys.intern(self.sender_id)
+        self.recipient_id = sys.intern(self.recipient_id)
+        self.conversation_id = sys.intern(self.conversation_id)
 
     @classmethod
     def message_to_dict(cls, message: "Message") -> Dict[str, Any]:
@@ -30,10 +41,11 @@ class Message:
 
         # Sometimes the Message objects are conversions from the MongoDB
         # document, in these cases we need to first convert the string fields
-        # into the correct type
+        # into the correct type. Timestamps are stored as BSON dates, older
+        # documents hold them as ISO format strings.
         timestamp = (
-            message.timestamp.isoformat()
-            if isinstance(message.timestamp, datetime)
+            datetime.fromisoformat(message.timestamp)
+            if isinstance(message.timestamp, str)
             else message.timestamp
         )
 
@@ -53,7 +65,7 @@ class Message:
             "metadata": message.metadata,
         }
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class Book:
     """Represents a book in the system"""
 
@@ -61,22 +73,25 @@ class Book:
     content: str
     author: str
     publication_year: Optional[int] = None
-    metadata: Dict[str, any] = field(default_factory=dict)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.author = sys.intern(self.author)
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class Author:
     """Represents an author and their associated data"""
 
     name: str
     whatsapp_number: str
     books: List[Book]
-    conversation_style: Dict[str, any]
+    conversation_style: Dict[str, Any]
     bio: Optional[str] = None
-    metadata: Dict[str, any] = field(default_factory=dict)
+    metadata: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class ConversationContext:
     """Represents the context of an ongoing conversation"""
 
@@ -86,10 +101,45 @@ class ConversationContext:
     messages: List[Message]
     created_at: datetime = field(default_factory=datetime.utcnow)
     last_updated: datetime = field(default_factory=datetime.utcnow)
-    metadata: Dict[str, any] = field(default_factory=dict)
-
-
-@dataclass
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    # Messages added since the context was last persisted
+    _unsaved_messages: List[Message] = field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
+    # (message count, text) of the last formatted history, see recent_history
+    _history_cache: Optional[Tuple[int, str]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def unsaved_messages(self) -> List[Message]:
+        """Messages added with add_message that have not been persisted yet"""
+        return self._unsaved_messages
+
+    def add_message(self, message: Message) -> None:
+        """Append a message to the conversation"""
+        self.messages.append(message)
+        self._unsaved_messages.append(message)
+        self._history_cache = None
+
+    def recent_history(self, count: int = 5) -> str:
+        """Format the last count messages as "sender: content" lines"""
+        # Prompts for every book of the author share the same history, so it
+        # is formatted once until the next message is added
+        if self._history_cache is None or self._history_cache[0] != count:
+            history = "\n".join(
+                f"{msg.sender_id}: {msg.content}" for msg in self.messages[-count:]
+            )
+            self._history_cache = (count, history)
+
+        return self._history_cache[1]
+
+    def mark_saved(self) -> None:
+        """Record that all added messages have been persisted"""
+        self._unsaved_messages.clear()
+
+
+@dataclass(**DATACLASS_OPTIONS)
 class GeneratedResponse:
     """Represents a response generated for a specific book"""
 
@@ -97,4 +147,7 @@ class GeneratedResponse:
     content: str
     confidence_score: float
     generation_time: datetime = field(default_factory=datetime.utcnow)
-    metadata: Dict[str, any] = field(default_factory=dict)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.book_title = sys.intern(self.book_title)
@@ -2,8 +2,10 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
 
+from .models import DATACLASS_OPTIONS
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, **DATACLASS_OPTIONS)
 class MessageId:
     """Value object for message identification"""
 
@@ -12,7 +14,7 @@ class MessageId:
     timestamp: datetime = field(default_factory=datetime.utcnow)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, **DATACLASS_OPTIONS)
 class UserId:
     """Value object for user identification"""
 
@@ -21,7 +23,7 @@ class UserId:
     metadata: Optional[dict] = None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, **DATACLASS_OPTIONS)
 class AuthorId:
     """Value object for author identification"""
 
@@ -1,42 +1,248 @@
+import asyncio
+from dataclasses import fields
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from motor.motor_asyncio import AsyncIOMotorClient
+from gridfs.errors import CorruptGridFile, NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
 
 from slavoj.core.exceptions import DatabaseError
 from slavoj.core.logging import LoggerFactory
 from slavoj.domain.interfaces import DatabaseInterface
 from slavoj.domain.models import Author, Book, ConversationContext, Message, MessageType
-from slavoj.utils.mongodb import strip_mongo_id
+from slavoj.utils.cache import TTLCache
+from slavoj.utils.mongodb import (
+    BOOK_CONTENT_BUCKET,
+    INDEXES,
+    create_client,
+    ensure_indexes,
+)
+
+
+def _projection(model: type, exclude: Tuple[str, ...] = ()) -> Dict[str, int]:
+    """Build a projection selecting a model's fields, without the _id field"""
+    projection = {
+        f.name: 1 for f in fields(model) if f.init and f.name not in exclude
+    }
+    projection["_id"] = 0
+    return projection
 
 
 class MongoDB(DatabaseInterface):
-    def __init__(self, connection_string: str, database: str):
-        self.client = AsyncIOMotorClient(connection_string)
+    # Only the fields mapped onto the domain models are read from MongoDB
+    BOOK_PROJECTION = {**_projection(Book), "content_id": 1}
+    BOOK_METADATA_PROJECTION = _projection(Book, exclude=("content",))
+    AUTHOR_PROJECTION = _projection(Author, exclude=("books",))
+    # Prompts only use the latest messages of a conversation, older ones stay
+    # in MongoDB rather than being turned into Message objects on every turn
+    CONTEXT_MESSAGE_WINDOW = 20
+    CONVERSATION_PROJECTION = {
+        **_projection(ConversationContext),
+        "messages": {"$slice": -CONTEXT_MESSAGE_WINDOW},
+    }
+
+    # Conversation documents keep only their latest messages embedded so they
+    # stay small however long the conversation runs, the messages collection
+    # holds the full history
+    MAX_EMBEDDED_MESSAGES = 100
+
+    # Upper bound on the books read for an author, fetched BOOK_BATCH_SIZE
+    # documents per round trip
+    MAX_BOOKS_PER_AUTHOR = 200
+    BOOK_BATCH_SIZE = 50
+
+    # Maximum number of queued messages written by a single insert_many
+    MESSAGE_BATCH_SIZE = 50
+
+    # Authors rarely change, lookups are cached for AUTHOR_CACHE_TTL seconds.
+    # Authors are modified by the setup scripts in another process, so the
+    # TTL is the only bound on how long the app serves a stale author.
+    AUTHOR_CACHE_SIZE = 1024
+    AUTHOR_CACHE_TTL = 300
+
+    # Fail fast when MongoDB is unreachable instead of holding webhook
+    # handlers for the 30s defaults, and compress the text heavy payloads.
+    # zlib ships with Python, zstd and snappy would need extra packages.
+    # The pool is sized for bursts of concurrent webhooks, requests that
+    # still can't get a connection fail after waitQueueTimeoutMS. The pool
+    # sizes are totals across the application's worker processes.
+    CLIENT_OPTIONS = {
+        "maxPoolSize": 100,
+        "minPoolSize": 10,
+        "maxIdleTimeMS": 30000,
+        "waitQueueTimeoutMS": 5000,
+        "serverSelectionTimeoutMS": 3000,
+        "connectTimeoutMS": 2000,
+        "socketTimeoutMS": 10000,
+        "compressors": "zlib",
+        "retryWrites": True,
+        "retryReads": True,
+    }
+
+    def __init__(self, connection_string: str, database: str, worker_count: int = 1):
+        """
+        Args:
+            connection_string: MongoDB connection URI
+            database: Database name
+            worker_count: Number of processes sharing the connection pool sizes
+        """
+        options = {
+            **self.CLIENT_OPTIONS,
+            "maxPoolSize": max(self.CLIENT_OPTIONS["maxPoolSize"] // worker_count, 1),
+            "minPoolSize": self.CLIENT_OPTIONS["minPoolSize"] // worker_count,
+        }
+        self.client = create_client(connection_string, **options)
         self.db = self.client[database]
+        self.content_fs = AsyncIOMotorGridFSBucket(
+            self.db, bucket_name=BOOK_CONTENT_BUCKET
+        )
         self.logger = LoggerFactory.create_logger("MongoDB")
 
+        self._authors_by_name: TTLCache[str, Author] = TTLCache(
+            self.AUTHOR_CACHE_SIZE, self.AUTHOR_CACHE_TTL
+        )
+        self._authors_by_whatsapp: TTLCache[str, Author] = TTLCache(
+            self.AUTHOR_CACHE_SIZE, self.AUTHOR_CACHE_TTL
+        )
+
+        # Messages are queued by store_message and written in batches
+        self._message_queue: asyncio.Queue = asyncio.Queue()
+        self._message_writer: Optional[asyncio.Task] = None
+
+    def start_message_writer(self) -> None:
+        """Start the background task that writes queued messages in batches"""
+        if self._message_writer is None:
+            self._message_writer = asyncio.create_task(self._write_messages())
+
+    async def close(self) -> None:
+        """Flush any queued messages and close the client"""
+        if self._message_writer is not None:
+            await self._message_queue.join()
+            self._message_writer.cancel()
+            try:
+                await self._message_writer
+            except asyncio.CancelledError:
+                pass
+            self._message_writer = None
+
+        self.client.close()
+
+    async def _write_messages(self) -> None:
+        """Drain the message queue, writing up to a batch per insert_many"""
+        while True:
+            batch = [await self._message_queue.get()]
+            while len(batch) < self.MESSAGE_BATCH_SIZE:
+                try:
+                    batch.append(self._message_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            try:
+                await self.db.messages.insert_many(
+                    [Message.message_to_dict(msg) for msg in batch], ordered=False
+                )
+                self.logger.info(f"Stored {len(batch)} messages")
+            except Exception as e:
+                self.logger.error(f"Failed to store {len(batch)} messages: {e}")
+            finally:
+                for _ in batch:
+                    self._message_queue.task_done()
+
+    async def ensure_indexes(self) -> None:
+        """Create the indexes backing the application's queries if missing"""
+        collections = list(INDEXES)
+        results = await asyncio.gather(
+            *[ensure_indexes(self.db, [collection]) for collection in collections],
+            return_exceptions=True,
+        )
+
+        for collection, result in zip(collections, results):
+            if isinstance(result, OperationFailure):
+                # Typically existing data violating a unique index, e.g.
+                # duplicate conversations written before the index existed.
+                # The application works without the index, so keep running.
+                self.logger.error(
+                    f"Failed to create indexes on {collection}, continuing "
+                    f"without them: {result}"
+                )
+            elif isinstance(result, Exception):
+                self.logger.error(f"Failed to create indexes: {result}")
+                raise DatabaseError(f"Failed to create indexes: {result}")
+
+        if not any(isinstance(result, Exception) for result in results):
+            self.logger.info("MongoDB indexes ensured")
+
     async def get_books_by_author(self, author: str) -> List[Book]:
         try:
-            cursor = self.db.books.find({"author": author})
-            books = await cursor.to_list(length=None)
+            # Sorted by title so prompts built from the books keep an identical
+            # prefix between queries, the author_title index provides the order
+            cursor = (
+                self.db.books.find({"author": author}, self.BOOK_PROJECTION)
+                .sort("title", ASCENDING)
+                .batch_size(self.BOOK_BATCH_SIZE)
+            )
+            books = await cursor.to_list(length=self.MAX_BOOKS_PER_AUTHOR)
+            if len(books) == self.MAX_BOOKS_PER_AUTHOR:
+                self.logger.warning(
+                    f"Author {author} has at least {self.MAX_BOOKS_PER_AUTHOR} "
+                    "books, only the first are used"
+                )
+
+            # Book text lives in GridFS, download it for all books concurrently
+            await asyncio.gather(*[self._load_book_content(book) for book in books])
 
-            return [Book(**strip_mongo_id(book)) for book in books]
+            return [Book(**book) for book in books]
         except Exception as e:
             self.logger.error(f"Failed to retrieve books: {e}")
             raise DatabaseError(f"Failed to retrieve books: {e}")
 
-    async def get_author(self, author_id: str) -> Optional[Author]:
+    async def _load_book_content(
+        self, book_doc: Dict[str, Any], retry: bool = True
+    ) -> None:
+        """
+        Replace a book document's GridFS content_id with the stored text.
+
+        Args:
+            book_doc: Book document read with BOOK_PROJECTION
+            retry: Re-read the document if its content was replaced meanwhile
+        """
+        content_id = book_doc.pop("content_id", None)
+        if content_id is None:
+            # Books written before GridFS was used keep their text inline
+            return
+
         try:
-            author_doc = await self.db.authors.find_one({"name": author_id})
-            if not author_doc:
-                return None
+            stream = await self.content_fs.open_download_stream(content_id)
+            book_doc["content"] = (await stream.read()).decode("utf-8")
+        except (NoFile, CorruptGridFile):
+            if not retry:
+                raise
+
+            # setup_books deletes a book's previous content once the document
+            # points at the new one, read the document again to follow it
+            self.logger.warning(
+                f"Content of {book_doc['title']} was replaced while reading"
+            )
+            latest = await self.db.books.find_one(
+                {"author": book_doc["author"], "title": book_doc["title"]},
+                self.BOOK_PROJECTION,
+            )
+            if latest is None:
+                raise
+            book_doc.clear()
+            book_doc.update(latest)
+            await self._load_book_content(book_doc, retry=False)
 
-            # Get books for this author
-            books = await self.get_books_by_author(author_id)
-            author_doc["books"] = books
+    async def get_author(self, author_id: str) -> Optional[Author]:
+        try:
+            author = self._authors_by_name.get(author_id)
+            if author is None:
+                author = await self._find_author({"name": author_id})
+                self._cache_author(author)
 
-            return Author(**strip_mongo_id(author_doc))
+            return author
         except Exception as e:
             self.logger.error(f"Failed to retrieve author: {e}")
             raise DatabaseError(f"Failed to retrieve author: {e}")
@@ -44,45 +250,82 @@ class MongoDB(DatabaseInterface):
     async def get_author_by_whatsapp(self, whatsapp_number: str) -> Optional[
         Author]:
         try:
-            author_doc = await self.db.authors.find_one(
-                {"whatsapp_number": whatsapp_number})
-            if not author_doc:
-                return None
-
-            # Get books for this author
-            books = await self.get_books_by_author(author_doc["name"])
-            author_doc["books"] = books
+            author = self._authors_by_whatsapp.get(whatsapp_number)
+            if author is None:
+                author = await self._find_author({"whatsapp_number": whatsapp_number})
+                self._cache_author(author)
 
-            return Author(**strip_mongo_id(author_doc))
+            return author
         except Exception as e:
             self.logger.error(
                 f"Failed to retrieve author by WhatsApp number: {e}")
             raise DatabaseError(
                 f"Failed to retrieve author by WhatsApp number: {e}")
 
+    def _cache_author(self, author: Optional[Author]) -> None:
+        """Cache an author under both of the keys it can be looked up by"""
+        if author is None:
+            return
+
+        self._authors_by_name.set(author.name, author)
+        self._authors_by_whatsapp.set(author.whatsapp_number, author)
+
+    async def _find_author(self, match: Dict[str, Any]) -> Optional[Author]:
+        """Fetch an author and their book metadata in a single aggregation"""
+        pipeline = [
+            {"$match": match},
+            {"$limit": 1},
+            {"$project": self.AUTHOR_PROJECTION},
+            # Join the author's books server side, without their content
+            {
+                "$lookup": {
+                    "from": "books",
+                    "localField": "name",
+                    "foreignField": "author",
+                    "pipeline": [{"$project": self.BOOK_METADATA_PROJECTION}],
+                    "as": "books",
+                }
+            },
+        ]
+        author_docs = await self.db.authors.aggregate(pipeline).to_list(length=1)
+        if not author_docs:
+            return None
+
+        author_doc = author_docs[0]
+        author_doc["books"] = [Book(content="", **book) for book in author_doc["books"]]
+
+        return Author(**author_doc)
+
     async def get_conversation_context(
         self, conversation_id: str
     ) -> Optional[ConversationContext]:
         try:
-            context = await self.db.conversations.find_one({"id": conversation_id})
+            context = await self.db.conversations.find_one(
+                {"id": conversation_id}, self.CONVERSATION_PROJECTION
+            )
             if not context:
                 return None
 
-            # Convert stored dates back to datetime objects
-            context["created_at"] = datetime.fromisoformat(context["created_at"])
-            context["last_updated"] = datetime.fromisoformat(context["last_updated"])
+            # Dates are stored as BSON dates and decoded by the driver, only
+            # conversations written before that hold ISO format strings
+            if isinstance(context["created_at"], str):
+                context["created_at"] = datetime.fromisoformat(context["created_at"])
+            if isinstance(context["last_updated"], str):
+                context["last_updated"] = datetime.fromisoformat(
+                    context["last_updated"]
+                )
 
-            # Convert message dictionaries to Message objects
-            context["messages"] = [Message(**strip_mongo_id(msg)) for msg in context["messages"]]
+            # Convert message dictionaries to Message objects, the projection
+            # already leaves out _id and embedded messages never carry one
+            context["messages"] = [Message(**msg) for msg in context["messages"]]
 
-            return ConversationContext(**strip_mongo_id(context))
+            return ConversationContext(**context)
         except Exception as e:
             self.logger.error(f"Failed to retrieve conversation: {e}")
             raise DatabaseError(f"Failed to retrieve conversation: {e}")
 
     async def store_conversation(self, conversation: ConversationContext) -> bool:
         try:
-            # Convert datetime objects to ISO format strings for storage
             conversation_dict = {
                 "id": conversation.id,
                 "user_id": conversation.user_id,
@@ -90,37 +333,53 @@ class MongoDB(DatabaseInterface):
                 "messages": [
                     Message.message_to_dict(msg) for msg in conversation.messages
                 ],
-                "created_at": conversation.created_at.isoformat(),
-                "last_updated": conversation.last_updated.isoformat(),
+                "created_at": conversation.created_at,
+                "last_updated": conversation.last_updated,
                 "metadata": conversation.metadata,
             }
 
             result = await self.db.conversations.insert_one(conversation_dict)
+            conversation.mark_saved()
             self.logger.info(f"Stored conversation: {result.inserted_id}")
             return True
+        except DuplicateKeyError:
+            # Another request created the conversation first
+            self.logger.info(f"Conversation already exists: {conversation.id}")
+            return False
         except Exception as e:
             self.logger.error(f"Failed to store conversation: {e}")
             raise DatabaseError(f"Failed to store conversation: {e}")
 
     async def update_conversation(self, conversation: ConversationContext) -> bool:
         try:
-            conversation_dict = {
-                "user_id": conversation.user_id,
-                "author_id": conversation.author_id,
-                "messages": [
-                    Message.message_to_dict(msg) for msg in conversation.messages
-                ],
-                "last_updated": conversation.last_updated.isoformat(),
-                "metadata": conversation.metadata,
+            update = {
+                "$set": {
+                    "last_updated": conversation.last_updated,
+                    "metadata": conversation.metadata,
+                }
             }
 
+            # Only append the messages added since the last write rather than
+            # rewriting the whole history, dropping the oldest past the limit
+            if conversation.unsaved_messages:
+                update["$push"] = {
+                    "messages": {
+                        "$each": [
+                            Message.message_to_dict(msg)
+                            for msg in conversation.unsaved_messages
+                        ],
+                        "$slice": -self.MAX_EMBEDDED_MESSAGES,
+                    }
+                }
+
             result = await self.db.conversations.update_one(
-                {"id": conversation.id}, {"$set": conversation_dict}
+                {"id": conversation.id}, update
             )
 
             if result.modified_count == 0:
                 raise DatabaseError(f"No conversation found with id: {conversation.id}")
 
+            conversation.mark_saved()
             self.logger.info(f"Updated conversation: {conversation.id}")
             return True
         except Exception as e:
@@ -129,6 +388,11 @@ class MongoDB(DatabaseInterface):
 
     async def store_message(self, message: Message) -> bool:
         try:
+            # Hand the message to the batch writer when it is running
+            if self._message_writer is not None:
+                self._message_queue.put_nowait(message)
+                return True
+
             message_dict = Message.message_to_dict(message)
             result = await self.db.messages.insert_one(message_dict)
             self.logger.info(f"Stored message: {result.inserted_id}")
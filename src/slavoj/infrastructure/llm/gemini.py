@@ -1,37 +1,157 @@
-from datetime import datetime
-from typing import List
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
 
 import google.generativeai as genai
+from google.api_core.exceptions import BadRequest
+from google.generativeai import caching
 
 from slavoj.core.config import LLMConfig
 from slavoj.core.exceptions import LLMError
 from slavoj.core.logging import LoggerFactory
 from slavoj.domain.interfaces import LLMInterface
-from slavoj.domain.models import ConversationContext, GeneratedResponse
+from slavoj.domain.models import Book, ConversationContext, GeneratedResponse
+from slavoj.utils.serialization import load_json
+
+# Prompt templates are built once and filled with str.format_map per request
+_BOOK_PROMPT = (
+    "You are helping to simulate a conversation with {author}.\n\n"
+    "Book Content:\n{book_content}\n\n"
+    "Previous Conversation:\n{history}\n\n"
+    "Current Query:\n{query}\n\n"
+    "Generate a response in the style of {author}\n"
+    "based on the ideas present in this specific book.\n"
+)
+
+_CACHED_BOOK_PROMPT = (
+    "You are helping to simulate a conversation with {author}.\n\n"
+    "The content of one of their books is provided in your context.\n\n"
+    "Previous Conversation:\n{history}\n\n"
+    "Current Query:\n{query}\n\n"
+    "Generate a response in the style of {author}\n"
+    "based on the ideas present in this specific book.\n"
+)
+
+_BATCH_PROMPT = (
+    "You are helping to simulate a conversation with {author}.\n\n"
+    "{books}\n\n"
+    "Previous Conversation:\n{history}\n\n"
+    "Current Query:\n{query}\n\n"
+    "For each book above, generate a response in the style of {author}\n"
+    "based on the ideas present in that specific book.\n"
+    "Reply with a JSON array holding one object per book, of the form\n"
+    '{{"book_title": "<title of the book>", "response": "<response>"}}.\n'
+)
+
+_SMALL_TALK_PROMPT = (
+    "You are {author}, chatting with a curious mind over text.\n\n"
+    "Previous Conversation:\n{history}\n\n"
+    "They just wrote:\n{query}\n\n"
+    "Reply briefly and naturally in the voice of {author}, in a single short\n"
+    "paragraph of no more than 300 characters. Do not detail the actions or\n"
+    "motions you are performing, this is a text message.\n"
+)
+
+_AGGREGATION_PROMPT = (
+    'The following are different responses to the query: "{query}"\n'
+    "Each response is generated based on a different book by the author.\n\n"
+    "{responses}\n\n"
+    "You are the author that wrote these books and a curious mind is having a\n"
+    "conversation with you over text. You must synthesize these responses and\n"
+    "respond to this person over text.\n\n"
+    "Please synthesize these responses into a single, coherent response that:\n"
+    "1. Looks at the key ideas from all books and picks the most relevant one, "
+    "or summarises them.\n"
+    "2. Maintains the author's voice and style\n"
+    "3. Presents a unified perspective\n"
+    "4. Mentions the relevant books only when absolutely necessary.\n"
+    "5. Is not longer than 1000 characters!\n"
+    "6. Does not have mutliple paragraphs with gaps. Is only a single paragraph.\n"
+    "7. Medium response length (400-800) characters preferred.\n"
+    "8. Do not detail the actions or motions you are performing, this is a text "
+    "message.\n\n"
+    "Synthesized response:\n"
+)
+
+
+class _BookCache(NamedTuple):
+    """A book's content held in Gemini's context cache"""
+
+    cache: caching.CachedContent
+    model: genai.GenerativeModel
+    refresh_at: datetime
+    expires_at: datetime
 
 
 class GeminiLLM(LLMInterface):
+    # How long uploaded book content stays in Gemini's context cache, a cache
+    # is recreated once less than BOOK_CACHE_REFRESH of its lifetime remains
+    BOOK_CACHE_TTL = timedelta(hours=1)
+    BOOK_CACHE_REFRESH = timedelta(minutes=5)
+
+    # Failed cache creations are retried after an exponential backoff
+    BOOK_CACHE_RETRY_DELAY = timedelta(seconds=30)
+    BOOK_CACHE_MAX_RETRY_DELAY = timedelta(minutes=30)
+
     def __init__(self, config: LLMConfig):
         self.config = config
         genai.configure(api_key=config.api_key)
+        self.generation_config = {
+            "temperature": config.temperature,
+            "max_output_tokens": config.max_tokens,
+        }
         self.model = genai.GenerativeModel(
             model_name=config.model,
-            generation_config={
-                "temperature": config.temperature,
-                "max_output_tokens": config.max_tokens,
-            },
+            generation_config=self.generation_config,
         )
         self.logger = LoggerFactory.create_logger("GeminiLLM")
 
+        # A batch request can't be given more output tokens than the model
+        # allows, regardless of the number of books
+        self.output_token_limit = (
+            config.max_output_tokens or self._get_output_token_limit()
+        )
+
+        # Context caches of books, keyed by (author, title). Caches are
+        # created by background tasks so an upload is never cut short by a
+        # request's timeout, requests fall back to the full prompt meanwhile.
+        self._book_caches: Dict[Tuple[str, str], _BookCache] = {}
+        self._book_cache_tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        # (retry at, consecutive failures) of books whose caching failed
+        self._book_cache_retries: Dict[Tuple[str, str], Tuple[datetime, int]] = {}
+        # Books Gemini refuses to cache, e.g. below the minimum token count
+        self._uncacheable_books: Set[Tuple[str, str]] = set()
+
     async def generate_response(
         self, book_title: str, book_content: str, conversation_context: ConversationContext, query: str
     ) -> GeneratedResponse:
         try:
-            # Construct prompt with book content and conversation history
-            prompt = self._construct_prompt(book_content, conversation_context, query)
+            # Prefer a model with the book already in Gemini's context cache so
+            # only the conversation and query are sent with each request
+            key = (conversation_context.author_id, book_title)
+            response = None
+            book_cache = self._get_book_cache(key, book_content)
+            if book_cache is not None:
+                try:
+                    # Awaiting the async client lets the per-book requests
+                    # gathered by the BookProcessor overlap
+                    response = await book_cache.model.generate_content_async(
+                        self._construct_cached_prompt(conversation_context, query)
+                    )
+                except Exception as e:
+                    # The cache may have expired or been deleted by another
+                    # worker, forget it and answer with the full prompt
+                    self.logger.warning(
+                        f"Cached generation failed for {book_title}: {e}"
+                    )
+                    if self._book_caches.get(key) is book_cache:
+                        del self._book_caches[key]
 
-            # Generate response
-            response = self.model.generate_content(prompt)
+            if response is None:
+                response = await self.model.generate_content_async(
+                    self._construct_prompt(book_content, conversation_context, query)
+                )
 
             return GeneratedResponse(
                 book_title=book_title,
@@ -44,6 +164,62 @@ class GeminiLLM(LLMInterface):
             self.logger.error(f"Gemini generation failed: {e}")
             raise LLMError(f"Failed to generate response: {e}")
 
+    async def generate_responses_batch(
+        self, books: List[Book], conversation_context: ConversationContext, query: str
+    ) -> List[GeneratedResponse]:
+        try:
+            prompt = self._construct_batch_prompt(books, conversation_context, query)
+
+            # One response is written per book, scale the output budget with
+            # them up to the model's limit and have the model emit JSON directly
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config={
+                    **self.generation_config,
+                    "max_output_tokens": min(
+                        self.config.max_tokens * len(books), self.output_token_limit
+                    ),
+                    "response_mime_type": "application/json",
+                },
+            )
+
+            titles = {book.title for book in books}
+            now = datetime.utcnow()
+            responses = [
+                GeneratedResponse(
+                    book_title=entry["book_title"],
+                    content=entry["response"],
+                    confidence_score=0.0,
+                    generation_time=now,
+                )
+                for entry in load_json(response.text)
+                if entry.get("book_title") in titles and entry.get("response")
+            ]
+
+            if not responses:
+                raise LLMError("No book responses in batch output")
+
+            return responses
+        except Exception as e:
+            self.logger.error(f"Gemini batch generation failed: {e}")
+            raise LLMError(f"Failed to generate batch responses: {e}")
+
+    def max_batch_size(self) -> int:
+        """Number of books whose responses fit the model's output limit"""
+        return max(self.output_token_limit // self.config.max_tokens, 1)
+
+    async def generate_small_talk(
+        self, conversation_context: ConversationContext, query: str
+    ) -> str:
+        try:
+            prompt = self._construct_small_talk_prompt(conversation_context, query)
+            response = await self.model.generate_content_async(prompt)
+
+            return response.text
+        except Exception as e:
+            self.logger.error(f"Small talk generation failed: {e}")
+            raise LLMError(f"Failed to generate small talk: {e}")
+
     async def aggregate_responses(
         self, responses: List[GeneratedResponse], query: str
     ) -> str:
@@ -51,8 +227,8 @@ class GeminiLLM(LLMInterface):
             # Construct aggregation prompt
             prompt = self._construct_aggregation_prompt(responses, query)
 
-            # Generate aggregated response
-            response = self.model.generate_content(prompt)
+            # Generate aggregated response without blocking the event loop
+            response = await self.model.generate_content_async(prompt)
 
             return response.text
         except Exception as e:
@@ -65,60 +241,192 @@ class GeminiLLM(LLMInterface):
             return False
         return True
 
+    def _get_output_token_limit(self) -> int:
+        """Look up the configured model's output token limit"""
+        try:
+            return genai.get_model(self.config.model).output_token_limit
+        except Exception as e:
+            # Without the limit each batch holds a single book's response,
+            # which disables batching
+            self.logger.warning(
+                f"Failed to get output token limit of {self.config.model}: {e}"
+            )
+            return self.config.max_tokens
+
+    def _get_book_cache(
+        self, key: Tuple[str, str], book_content: str
+    ) -> Optional[_BookCache]:
+        """Get a book's context cache, starting its creation if needed"""
+        if key in self._uncacheable_books:
+            return None
+
+        now = datetime.now(timezone.utc)
+        book_cache = self._book_caches.get(key)
+        if book_cache is None or book_cache.refresh_at <= now:
+            self._schedule_book_cache(key, book_content)
+
+        # A cache due for a refresh stays usable until it expires
+        if book_cache is not None and book_cache.expires_at > now:
+            return book_cache
+        return None
+
+    def _schedule_book_cache(self, key: Tuple[str, str], book_content: str) -> None:
+        """Create a book's context cache in the background"""
+        if key in self._book_cache_tasks:
+            return
+
+        retry = self._book_cache_retries.get(key)
+        if retry is not None and retry[0] > datetime.now(timezone.utc):
+            return
+
+        task = asyncio.create_task(self._create_book_cache(key, book_content))
+        self._book_cache_tasks[key] = task
+        task.add_done_callback(lambda _: self._book_cache_tasks.pop(key, None))
+
+    async def _create_book_cache(self, key: Tuple[str, str], book_content: str) -> None:
+        """Find or create a book's context cache and replace the previous one"""
+        author, book_title = key
+        loop = asyncio.get_running_loop()
+        try:
+            cache = await loop.run_in_executor(
+                None, self._find_or_create_cache, key, book_content
+            )
+        except BadRequest as e:
+            # Invalid requests, e.g. too few tokens to cache, won't succeed
+            # on a retry
+            self.logger.warning(f"Context caching unavailable for {book_title}: {e}")
+            self._uncacheable_books.add(key)
+            return
+        except Exception as e:
+            failures = self._book_cache_retries.get(key, (None, 0))[1] + 1
+            delay = min(
+                self.BOOK_CACHE_RETRY_DELAY * 2 ** (failures - 1),
+                self.BOOK_CACHE_MAX_RETRY_DELAY,
+            )
+            self._book_cache_retries[key] = (
+                datetime.now(timezone.utc) + delay,
+                failures,
+            )
+            self.logger.warning(
+                f"Context caching failed for {book_title}, retrying in {delay}: {e}"
+            )
+            return
+
+        self._book_cache_retries.pop(key, None)
+        expires_at = cache.expire_time.astimezone(timezone.utc)
+        previous = self._book_caches.get(key)
+        self._book_caches[key] = _BookCache(
+            cache=cache,
+            model=genai.GenerativeModel.from_cached_content(
+                cache, generation_config=self.generation_config
+            ),
+            refresh_at=expires_at - self.BOOK_CACHE_REFRESH,
+            expires_at=expires_at,
+        )
+        self.logger.info(f"Cached content of {book_title} for {author}")
+
+        # Remove the replaced cache rather than paying for it until it expires
+        if previous is not None and previous.cache.name != cache.name:
+            try:
+                await loop.run_in_executor(None, previous.cache.delete)
+            except Exception as e:
+                self.logger.warning(f"Failed to delete replaced cache: {e}")
+
+    def _find_or_create_cache(
+        self, key: Tuple[str, str], book_content: str
+    ) -> caching.CachedContent:
+        """
+        Find a book's context cache or create it, blocking.
+
+        Each uvicorn worker runs its own GeminiLLM, caches are looked up by
+        display name first so workers share one copy of each book.
+        """
+        author, book_title = key
+        # A digest keeps names unique within the 128 character limit
+        digest = hashlib.sha1(
+            f"{self.config.model}\0{author}\0{book_title}".encode("utf-8")
+        ).hexdigest()[:16]
+        display_name = f"slavoj-{digest} {author}: {book_title}"[:128]
+
+        usable_until = datetime.now(timezone.utc) + self.BOOK_CACHE_REFRESH
+        existing = [
+            cache
+            for cache in caching.CachedContent.list(page_size=100)
+            if cache.display_name == display_name
+            and cache.expire_time.astimezone(timezone.utc) > usable_until
+        ]
+        if existing:
+            return max(existing, key=lambda cache: cache.expire_time)
+
+        return caching.CachedContent.create(
+            model=self.config.model,
+            display_name=display_name,
+            contents=[book_content],
+            ttl=self.BOOK_CACHE_TTL,
+        )
+
     def _construct_prompt(
         self, book_content: str, conversation_context: ConversationContext, query: str
     ) -> str:
         """Construct prompt for single-book response generation"""
-        conversation_history = "\n".join(
-            [
-                f"{msg.sender_id}: {msg.content}"
-                for msg in conversation_context.messages[-5:]  # Last 5 messages
-            ]
+        return _BOOK_PROMPT.format_map(
+            {
+                "author": conversation_context.author_id,
+                "book_content": book_content,
+                "history": conversation_context.recent_history(),
+                "query": query,
+            }
         )
 
-        return f"""
-        You are helping to simulate a conversation with {conversation_context.author_id}.
-
-        Book Content:
-        {book_content}
+    def _construct_cached_prompt(
+        self, conversation_context: ConversationContext, query: str
+    ) -> str:
+        """Construct prompt for a model whose cached context holds the book"""
+        return _CACHED_BOOK_PROMPT.format_map(
+            {
+                "author": conversation_context.author_id,
+                "history": conversation_context.recent_history(),
+                "query": query,
+            }
+        )
 
-        Previous Conversation:
-        {conversation_history}
+    def _construct_batch_prompt(
+        self, books: List[Book], conversation_context: ConversationContext, query: str
+    ) -> str:
+        """Construct prompt for generating responses for several books at once"""
+        formatted_books = "\n\n".join(
+            f"Book: {book.title}\nBook Content:\n{book.content}" for book in books
+        )
 
-        Current Query:
-        {query}
+        return _BATCH_PROMPT.format_map(
+            {
+                "author": conversation_context.author_id,
+                "books": formatted_books,
+                "history": conversation_context.recent_history(),
+                "query": query,
+            }
+        )
 
-        Generate a response in the style of {conversation_context.author_id} 
-        based on the ideas present in this specific book.
-        """
+    def _construct_small_talk_prompt(
+        self, conversation_context: ConversationContext, query: str
+    ) -> str:
+        """Construct prompt for a reply that draws on no book"""
+        return _SMALL_TALK_PROMPT.format_map(
+            {
+                "author": conversation_context.author_id,
+                "history": conversation_context.recent_history(),
+                "query": query,
+            }
+        )
 
     def _construct_aggregation_prompt(
         self, responses: List[GeneratedResponse], query: str
     ) -> str:
         """Construct prompt for response aggregation"""
         formatted_responses = "\n\n".join(
-            [f"From {r.book_title}:\n{r.content}" for r in responses]
+            f"From {r.book_title}:\n{r.content}" for r in responses
         )
 
-        return f"""
-        The following are different responses to the query: "{query}"
-        Each response is generated based on a different book by the author.
-
-        {formatted_responses}
-        
-        You are the author that wrote these books and a curious mind is having a 
-        conversation with you over text. You must synthesize these responses and
-        respond to this person over text.
-
-        Please synthesize these responses into a single, coherent response that:
-        1. Looks at the key ideas from all books and picks the most relevant one, or summarises them. 
-        2. Maintains the author's voice and style
-        3. Presents a unified perspective
-        4. Mentions the relevant books only when absolutely necessary. 
-        5. Is not longer than 1000 characters!
-        6. Does not have mutliple paragraphs with gaps. Is only a single paragraph.
-        7. Medium response length (400-800) characters preferred.
-        8. Do not detail the actions or motions you are performing, this is a text message.
-
-        Synthesized response:
-        """
+        return _AGGREGATION_PROMPT.format_map(
+            {"query": query, "responses": formatted_responses}
+        )
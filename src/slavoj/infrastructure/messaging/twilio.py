@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from twilio.base.exceptions import TwilioRestException
+from twilio.http.async_http_client import AsyncTwilioHttpClient
 from twilio.rest import Client
 
 from slavoj.core.config import TwilioConfig
@@ -9,19 +10,43 @@ from slavoj.core.logging import LoggerFactory
 from slavoj.domain.interfaces import MessagingInterface
 from slavoj.domain.models import Message, MessageType
 
+# Twilio addresses WhatsApp numbers as "whatsapp:<number>"
+WHATSAPP_PREFIX = "whatsapp:"
+
+
+def strip_whatsapp_prefix(address: str) -> str:
+    """
+    Get the phone number from a Twilio WhatsApp address.
+
+    Args:
+        address: Address such as "whatsapp:+1234567890"
+    """
+    if address.startswith(WHATSAPP_PREFIX):
+        return address[len(WHATSAPP_PREFIX) :]
+    return address
+
 
 class TwilioAdapter(MessagingInterface):
     def __init__(self, config: TwilioConfig):
         self.config = config
-        self.client = Client(config.account_sid, config.auth_token)
+        # The default client sends requests synchronously, the aiohttp based
+        # client lets sends be awaited without blocking the event loop
+        self.http_client = AsyncTwilioHttpClient()
+        self.client = Client(
+            config.account_sid, config.auth_token, http_client=self.http_client
+        )
         self.logger = LoggerFactory.create_logger("TwilioAdapter")
 
-    def send_message(self, message: Message) -> bool:
+    async def close(self) -> None:
+        """Close the HTTP session used to reach Twilio"""
+        await self.http_client.close()
+
+    async def send_message(self, message: Message) -> bool:
         try:
-            response = self.client.messages.create(
+            response = await self.client.messages.create_async(
                 body=message.content,
-                from_=f"whatsapp:{message.sender_id}",
-                to=f"whatsapp:{message.recipient_id}",
+                from_=WHATSAPP_PREFIX + message.sender_id,
+                to=WHATSAPP_PREFIX + message.recipient_id,
             )
             self.logger.info(f"Message sent successfully: {response.sid}")
             return True
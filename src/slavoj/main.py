@@ -1,11 +1,14 @@
+import dataclasses
 import os
 import sys
 from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Dict
+from urllib.parse import parse_qsl
 
 import uvicorn
 from fastapi import FastAPI, Request, Response
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
 # Add src directory to Python path
 sys.path.append(str(Path(__file__).parent.parent))
@@ -15,7 +18,10 @@ from slavoj.core.exceptions import BaseError
 from slavoj.core.logging import LoggerFactory
 from slavoj.infrastructure.database.mongodb import MongoDB
 from slavoj.infrastructure.llm.factory import LLMFactory
-from slavoj.infrastructure.messaging.twilio import TwilioAdapter
+from slavoj.infrastructure.messaging.twilio import (
+    TwilioAdapter,
+    strip_whatsapp_prefix,
+)
 from slavoj.services.book_processor import BookProcessor
 from slavoj.services.conversation import ConversationManager
 from slavoj.services.messaging import MessagingService
@@ -23,6 +29,14 @@ from slavoj.services.messaging import MessagingService
 logger = LoggerFactory.create_logger("main")
 
 
+def worker_count() -> int:
+    """Number of uvicorn worker processes serving the application"""
+    # Reloading only supports a single process
+    if os.getenv("APP_ENVIRONMENT") == "development":
+        return 1
+    return max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+
+
 class Application:
     def __init__(self):
         self.config: AppConfig = None
@@ -40,10 +54,19 @@ class Application:
             config_loader = ConfigLoader()
             self.config = config_loader.load_config()
 
+            # Each worker process holds its own MongoDB pool, concurrency
+            # limit and caches. The pool size and the book concurrency limit
+            # are totals for the application, split between the workers.
+            workers = worker_count()
+
             # Initialize database
             self.db = MongoDB(
-                self.config.mongodb.connection_string, self.config.mongodb.database
+                self.config.mongodb.connection_string,
+                self.config.mongodb.database,
+                worker_count=workers,
             )
+            await self.db.ensure_indexes()
+            self.db.start_message_writer()
 
             # Initialize LLM
             self.llm = LLMFactory.create_llm(self.config.llm)
@@ -52,8 +75,16 @@ class Application:
             self.twilio_adapter = TwilioAdapter(self.config.twilio)
 
             # Initialize services
+            processing = self.config.processing
             self.book_processor = BookProcessor(
-                self.db, self.llm, self.config.processing
+                self.db,
+                self.llm,
+                dataclasses.replace(
+                    processing,
+                    max_concurrent_books=max(
+                        processing.max_concurrent_books // workers, 1
+                    ),
+                ),
             )
 
             self.conversation_manager = ConversationManager(
@@ -68,6 +99,35 @@ class Application:
             logger.error(f"Failed to initialize application: {e}")
             raise
 
+    async def shutdown(self):
+        """Release application resources, flushing any pending writes"""
+        # Conversation writes still in flight feed the database's message
+        # queue, so they finish before the database is closed
+        if self.conversation_manager is not None:
+            await self.conversation_manager.close()
+
+        if self.twilio_adapter is not None:
+            await self.twilio_adapter.close()
+
+        if self.db is not None:
+            await self.db.close()
+
+        logger.info("Application shut down")
+
+
+async def read_form(request: Request) -> Dict[str, str]:
+    """
+    Parse a URL encoded webhook body.
+
+    Twilio posts small flat forms, parsing the body directly avoids the
+    multipart machinery behind request.form().
+
+    Args:
+        request: Incoming webhook request
+    """
+    body = await request.body()
+    return dict(parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+
 
 def create_app() -> FastAPI:
     """Factory function to create and initialize the FastAPI app"""
@@ -77,9 +137,12 @@ def create_app() -> FastAPI:
     async def lifespan(app: FastAPI):
         await app_instance.startup()
         yield
+        await app_instance.shutdown()
 
     # Create FastAPI instance with initialized app_instance
-    app = FastAPI(title="Slavoj", lifespan=lifespan)
+    app = FastAPI(
+        title="Slavoj", lifespan=lifespan, default_response_class=ORJSONResponse
+    )
 
     # Register routes
     @app.post("/webhook/twilio")
@@ -87,12 +150,20 @@ def create_app() -> FastAPI:
         """Handle incoming Twilio WhatsApp messages"""
         try:
             # Parse form data from Twilio
-            form_data = await request.form()
+            form_data = await read_form(request)
 
             # Extract message details
-            message_content = form_data.get("Body")
-            sender_id = form_data.get("From").replace("whatsapp:", "")
-            recipient_id = form_data.get("To").replace("whatsapp:", "")
+            message_content = form_data.get("Body", "")
+            sender = form_data.get("From")
+            recipient = form_data.get("To")
+            if not sender or not recipient:
+                logger.warning("Rejected message without From or To address")
+                return ORJSONResponse(
+                    status_code=400, content={"error": "Missing From or To"}
+                )
+
+            sender_id = strip_whatsapp_prefix(sender)
+            recipient_id = strip_whatsapp_prefix(recipient)
 
             # Log incoming message
             logger.info(f"Received message from {sender_id}: {message_content}")
@@ -108,7 +179,7 @@ def create_app() -> FastAPI:
             response = await app_instance.conversation_manager.process_message(message)
 
             # Send response back to user
-            app_instance.messaging_service.send_message(
+            await app_instance.messaging_service.send_message(
                 content=response,
                 recipient_id=sender_id,
                 sender_id=recipient_id,
@@ -119,10 +190,10 @@ def create_app() -> FastAPI:
 
         except BaseError as e:
             logger.error(f"Application error: {e}")
-            return JSONResponse(status_code=400, content={"error": str(e)})
+            return ORJSONResponse(status_code=400, content={"error": str(e)})
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=500, content={"error": "Internal server error"}
             )
 
@@ -130,7 +201,7 @@ def create_app() -> FastAPI:
     async def status_webhook(request: Request):
         """Handle Twilio message status updates"""
         try:
-            form_data = await request.form()
+            form_data = await read_form(request)
             message_id = form_data.get("MessageSid")
             status = form_data.get("MessageStatus")
 
@@ -142,7 +213,7 @@ def create_app() -> FastAPI:
 
         except Exception as e:
             logger.error(f"Error handling status update: {e}")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=500, content={"error": "Internal server error"}
             )
 
@@ -158,9 +229,19 @@ def create_app() -> FastAPI:
 app = create_app()
 
 if __name__ == "__main__":
+    reload = os.getenv("APP_ENVIRONMENT") == "development"
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True if os.getenv("APP_ENVIRONMENT") == "development" else False,
+        # uvloop and httptools are dependencies, name them so the server
+        # fails loudly rather than silently falling back to the pure Python
+        # implementations if they go missing
+        loop="uvloop" if sys.platform != "win32" else "asyncio",
+        http="httptools",
+        reload=reload,
+        # Each worker process runs its own event loop and lifespan, and so
+        # its own MongoDB pool and clients. Set WEB_CONCURRENCY to run more.
+        workers=None if reload else worker_count(),
     )
@@ -1,5 +1,7 @@
 import asyncio
-from typing import List
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
 
 from slavoj.core.config import ProcessingConfig
 from slavoj.core.exceptions import BookProcessingError
@@ -10,9 +12,25 @@ from slavoj.domain.interfaces import (
     LLMInterface,
 )
 from slavoj.domain.models import Book, ConversationContext, GeneratedResponse
+from slavoj.utils.cache import TTLCache
 
 
 class BookProcessor(BookProcessorInterface):
+    # Authors whose books total at most this many characters are answered
+    # with a single batched LLM request instead of one request per book
+    BATCH_CONTENT_LIMIT = 100_000
+
+    # Authors whose batched request failed are answered per book for
+    # BATCH_FAILURE_TTL seconds rather than paying for a failing batch first
+    BATCH_FAILURE_TTL = 900
+
+    # An author's books rarely change, they are kept in memory for
+    # BOOK_CACHE_TTL seconds rather than read from MongoDB for every message.
+    # setup_books runs in another process, so the TTL is the only bound on
+    # how long updated books take to be served.
+    BOOK_CACHE_SIZE = 64
+    BOOK_CACHE_TTL = 600
+
     def __init__(
         self, db: DatabaseInterface, llm: LLMInterface, config: ProcessingConfig
     ):
@@ -21,27 +39,59 @@ class BookProcessor(BookProcessorInterface):
         self.config = config
         self.logger = LoggerFactory.create_logger("BookProcessor")
 
+        # Books processed at once across all queries of this process, so a
+        # burst of webhooks can't multiply the load put on the LLM provider
+        self._concurrency_limit = config.max_concurrent_books
+        self._in_flight = 0
+        self._admission = asyncio.Condition()
+
+        self._books: TTLCache[str, List[Book]] = TTLCache(
+            self.BOOK_CACHE_SIZE, self.BOOK_CACHE_TTL
+        )
+        # Concurrent messages to the same author wait for a single fetch
+        self._book_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+        self._batch_failures: TTLCache[str, bool] = TTLCache(
+            self.BOOK_CACHE_SIZE, self.BATCH_FAILURE_TTL
+        )
+
     async def process_query(
         self, query: str, author: str, conversation_context: ConversationContext
     ) -> List[GeneratedResponse]:
         try:
             # Get all books for the author
-            books = await self.db.get_books_by_author(author)
+            books = await self._get_books(author)
             if not books:
                 self.logger.warning(f"No books found for author: {author}")
                 return []
 
-            # Process books in parallel with concurrency limit
-            semaphore = asyncio.Semaphore(self.config.max_concurrent_books)
-            tasks = [
-                self._process_book_with_semaphore(
-                    book, conversation_context, query, semaphore
+            batch_responses: List[GeneratedResponse] = []
+            if self._should_batch(author, books):
+                batch_responses = (
+                    await self._process_books_batch(books, conversation_context, query)
+                    or []
                 )
+
+                # A truncated batch only answers some of the books, the rest
+                # are processed on their own below
+                answered = {response.book_title for response in batch_responses}
+                books = [book for book in books if book.title not in answered]
+                if not books:
+                    return batch_responses
+
+                self.logger.warning(
+                    f"Batch missed {len(books)} books of {author}, processing them"
+                )
+                self._batch_failures.set(author, True)
+
+            # Process books in parallel with the shared concurrency limit
+            tasks = [
+                self._process_book_with_limit(book, conversation_context, query)
                 for book in books
             ]
 
             responses = await asyncio.gather(*tasks)
-            return [
+            return batch_responses + [
                 r for r in responses if r is not None
             ]  # Filter out any failed responses
 
@@ -64,15 +114,69 @@ class BookProcessor(BookProcessorInterface):
             self.logger.error(f"Single book processing failed: {e}")
             raise BookProcessingError(f"Failed to process book {book.title}: {e}")
 
-    async def _process_book_with_semaphore(
-        self,
-        book: Book,
-        conversation_context: ConversationContext,
-        query: str,
-        semaphore: asyncio.Semaphore,
+    async def _get_books(self, author: str) -> List[Book]:
+        """Get an author's books, from the cache when possible"""
+        books = self._books.get(author)
+        if books is not None:
+            return books
+
+        async with self._book_locks[author]:
+            books = self._books.get(author)
+            if books is None:
+                books = await self.db.get_books_by_author(author)
+                self._books.set(author, books)
+
+        return books
+
+    def _should_batch(self, author: str, books: List[Book]) -> bool:
+        """Whether an author's books are answered with one batched request"""
+        return (
+            1 < len(books) <= self.llm.max_batch_size()
+            and sum(len(book.content) for book in books) <= self.BATCH_CONTENT_LIMIT
+            and not self._batch_failures.get(author, False)
+        )
+
+    async def _process_books_batch(
+        self, books: List[Book], conversation_context: ConversationContext, query: str
+    ) -> Optional[List[GeneratedResponse]]:
+        """Process several books with one LLM request, None if it fails"""
+        async with self._admit():
+            try:
+                return await asyncio.wait_for(
+                    self.llm.generate_responses_batch(
+                        books=books,
+                        conversation_context=conversation_context,
+                        query=query,
+                    ),
+                    timeout=self.config.response_timeout,
+                )
+            except asyncio.TimeoutError:
+                self.logger.warning("Batch processing timed out, processing books")
+                return None
+            except Exception as e:
+                self.logger.warning(f"Batch processing failed, processing books: {e}")
+                return None
+
+    @asynccontextmanager
+    async def _admit(self) -> AsyncIterator[None]:
+        """Wait until the number of books in flight is below the limit"""
+        async with self._admission:
+            await self._admission.wait_for(
+                lambda: self._in_flight < self._concurrency_limit
+            )
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._admission:
+                self._in_flight -= 1
+                self._admission.notify(1)
+
+    async def _process_book_with_limit(
+        self, book: Book, conversation_context: ConversationContext, query: str
     ) -> GeneratedResponse:
-        """Process a single book with semaphore for concurrency control"""
-        async with semaphore:
+        """Process a single book within the shared concurrency limit"""
+        async with self._admit():
             try:
                 return await asyncio.wait_for(
                     self.process_single_book(book, conversation_context, query),
@@ -1,5 +1,9 @@
+import asyncio
+import functools
+import string
 import uuid
 from datetime import datetime
+from typing import Any, Coroutine, Dict, Set, Tuple
 
 from slavoj.core.exceptions import ConversationError
 from slavoj.core.logging import LoggerFactory
@@ -10,9 +14,43 @@ from slavoj.domain.interfaces import (
     LLMInterface,
 )
 from slavoj.domain.models import ConversationContext, Message, MessageType
+from slavoj.utils.cache import TTLCache
 
 
 class ConversationManager(ConversationManagerInterface):
+    # Replies to the opening message of a conversation, which has no history
+    # to depend on, are reused for the same question to the same author
+    RESPONSE_CACHE_SIZE = 1024
+    RESPONSE_CACHE_TTL = 3600
+
+    # Messages this short, or made up of one of these phrases, are answered
+    # with a single small talk LLM call rather than a query over every book.
+    # Three letter replies such as "why" or "yes" continue the conversation
+    # and must reach the books, so the limit is two characters.
+    SMALL_TALK_MAX_LENGTH = 2
+    SMALL_TALK_PHRASES = frozenset(
+        {
+            "hi",
+            "hello",
+            "hey",
+            "yo",
+            "ok",
+            "okay",
+            "cool",
+            "nice",
+            "great",
+            "thanks",
+            "thank you",
+            "thx",
+            "lol",
+            "haha",
+            "bye",
+            "goodbye",
+            "good morning",
+            "good night",
+        }
+    )
+
     def __init__(
         self,
         db: DatabaseInterface,
@@ -24,28 +62,57 @@ class ConversationManager(ConversationManagerInterface):
         self.llm = llm
         self.logger = LoggerFactory.create_logger("ConversationManager")
 
+        # Strong references to writes running in the background, the event
+        # loop only keeps weak references to tasks
+        self._background_tasks: Set[asyncio.Task] = set()
+        # The latest exchange being written for each conversation, the next
+        # message waits for it so its context read includes that exchange
+        self._pending_updates: Dict[str, asyncio.Task] = {}
+
+        self._response_cache: TTLCache[Tuple[str, str], str] = TTLCache(
+            self.RESPONSE_CACHE_SIZE, self.RESPONSE_CACHE_TTL
+        )
+
     async def process_message(self, message: Message) -> str:
         try:
+            # The inbound message doesn't feed the prompt, store it while the
+            # response is generated rather than after
+            self._run_in_background(self.db.store_message(message))
+
             # Get or create conversation context
             context = await self.get_or_create_context(message.conversation_id, message)
 
-            # Process query against all books
-            responses = await self.book_processor.process_query(
-                query=message.content,
-                author=context.author_id,
-                conversation_context=context,
-            )
+            # Follow-ups depend on the conversation so only opening messages
+            # are answered from the cache
+            cache_key = None
+            final_response = None
+            if not context.messages:
+                cache_key = (context.author_id, self._normalize_query(message.content))
+                final_response = self._response_cache.get(cache_key)
 
-            if not responses:
-                raise ConversationError("No responses generated from books")
+            if final_response is None:
+                if self._is_small_talk(message.content):
+                    # Not cached, every conversation opening with "hi" would
+                    # otherwise get the same greeting
+                    final_response = await self.llm.generate_small_talk(
+                        conversation_context=context, query=message.content
+                    )
+                else:
+                    final_response = await self._generate_response(context, message)
+                    if cache_key is not None:
+                        self._response_cache.set(cache_key, final_response)
+            else:
+                self.logger.info(f"Answered from cache for {context.author_id}")
 
-            # Aggregate responses
-            final_response = await self.llm.aggregate_responses(
-                responses=responses, query=message.content
+            # Persist the exchange in the background, the reply doesn't
+            # depend on it so it can be sent without waiting on the writes
+            update = self._run_in_background(
+                self.update_context(context, message, final_response)
+            )
+            self._pending_updates[context.id] = update
+            update.add_done_callback(
+                functools.partial(self._on_update_done, context.id)
             )
-
-            # Update conversation context
-            await self.update_context(context, message, final_response)
 
             return final_response
 
@@ -53,8 +120,70 @@ class ConversationManager(ConversationManagerInterface):
             self.logger.error(f"Message processing failed: {e}")
             raise ConversationError(f"Failed to process message: {e}")
 
+    async def close(self) -> None:
+        """Wait for background writes to finish before shutting down"""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+
+    async def _generate_response(
+        self, context: ConversationContext, message: Message
+    ) -> str:
+        """Answer a message from each of the author's books and combine them"""
+        # Process query against all books
+        responses = await self.book_processor.process_query(
+            query=message.content,
+            author=context.author_id,
+            conversation_context=context,
+        )
+
+        if not responses:
+            raise ConversationError("No responses generated from books")
+
+        # Aggregate responses
+        return await self.llm.aggregate_responses(
+            responses=responses, query=message.content
+        )
+
+    def _is_small_talk(self, query: str) -> bool:
+        """Check whether a message is too slight to query the books with"""
+        text = self._normalize_query(query).strip(string.punctuation + " ")
+        return (
+            len(text) <= self.SMALL_TALK_MAX_LENGTH or text in self.SMALL_TALK_PHRASES
+        )
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """Normalize case and whitespace so trivially different queries match"""
+        return " ".join(query.casefold().split())
+
+    def _run_in_background(self, coroutine: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """Schedule a coroutine, logging rather than raising its failure"""
+        task = asyncio.create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._on_background_task_done)
+        return task
+
+    def _on_background_task_done(self, task: asyncio.Task) -> None:
+        """Forget a finished background task and log its failure"""
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error(f"Background task failed: {task.exception()}")
+
+    def _on_update_done(self, conversation_id: str, task: asyncio.Task) -> None:
+        """Forget a conversation's finished write unless a newer one replaced it"""
+        if self._pending_updates.get(conversation_id) is task:
+            del self._pending_updates[conversation_id]
+
     async def get_or_create_context(self, conversation_id: str, message: Message) -> ConversationContext:
         try:
+            # Wait for the previous exchange to be written, otherwise the read
+            # below can miss it. asyncio.wait rather than awaiting the task so
+            # its failure is left to the background task logging and this
+            # message being cancelled doesn't cancel the write.
+            pending = self._pending_updates.get(message.conversation_id)
+            if pending is not None:
+                await asyncio.wait({pending})
+
             # Try to get existing context
             context = await self.db.get_conversation_context(message.conversation_id)
             if context:
@@ -67,20 +196,32 @@ class ConversationManager(ConversationManagerInterface):
                     f"No author found for WhatsApp number: {message.recipient_id}")
 
             # Create new context if none exists
+            now = datetime.utcnow()
             new_context = ConversationContext(
                 id=message.conversation_id,
                 user_id=message.sender_id, # Will be set from first message
                 author_id=author.name,  # Will be set from configuration
                 messages=[],
-                created_at=datetime.utcnow(),
-                last_updated=datetime.utcnow(),
+                created_at=now,
+                last_updated=now,
                 metadata={
                     "author_whatsapp": author.whatsapp_number,
                     "user_whatsapp": message.sender_id
                 }
             )
 
-            await self.db.store_conversation(new_context)
+            if not await self.db.store_conversation(new_context):
+                # A concurrent first message created the conversation between
+                # the lookup and the insert, continue with the stored one
+                context = await self.db.get_conversation_context(
+                    message.conversation_id
+                )
+                if context:
+                    return context
+                raise ConversationError(
+                    f"Conversation {message.conversation_id} could not be stored"
+                )
+
             return new_context
 
         except Exception as e:
@@ -92,30 +233,29 @@ class ConversationManager(ConversationManagerInterface):
     ) -> None:
         try:
             # Add user message to context
-            context.messages.append(message)
+            context.add_message(message)
 
             # Create and add response message
+            now = datetime.utcnow()
             response_message = Message(
                 content=response,
-                timestamp=datetime.utcnow(),
+                timestamp=now,
                 sender_id=context.author_id,
                 recipient_id=message.sender_id,
                 conversation_id=context.id,
                 message_type=MessageType.AUTHOR,
             )
-            context.messages.append(response_message)
+            context.add_message(response_message)
 
             # Update last_updated timestamp
-            context.last_updated = datetime.utcnow()
-
-            # Store user message
-            await self.db.store_message(message)
+            context.last_updated = now
 
-            # Store response message
-            await self.db.store_message(response_message)
-
-            # Update conversation context
-            await self.db.update_conversation(context)
+            # Store the response message and update the conversation
+            # concurrently, the user message was stored on arrival
+            await asyncio.gather(
+                self.db.store_message(response_message),
+                self.db.update_conversation(context),
+            )
 
         except Exception as e:
             self.logger.error(f"Failed to update conversation context: {e}")
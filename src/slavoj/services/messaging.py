@@ -12,7 +12,7 @@ class MessagingService:
         self.adapter = messaging_adapter
         self.logger = LoggerFactory.create_logger("MessagingService")
 
-    def send_message(
+    async def send_message(
         self, content: str, recipient_id: str, sender_id: str, conversation_id: str
     ) -> bool:
         """Send a message to a user"""
@@ -26,7 +26,7 @@ class MessagingService:
                 message_type=MessageType.AUTHOR,
             )
 
-            return self.adapter.send_message(message)
+            return await self.adapter.send_message(message)
 
         except Exception as e:
             self.logger.error(f"Failed to send message: {e}")
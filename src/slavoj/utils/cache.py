@@ -0,0 +1,57 @@
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    In-memory least recently used cache whose entries expire after a fixed time.
+
+    Not thread-safe, intended for use from a single event loop.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        Args:
+            maxsize: Maximum number of entries kept before evicting the oldest
+            ttl: Seconds an entry stays valid after it is set
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Return the cached value for key, or default if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        """Cache a value, evicting the least recently used entry if full"""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        """Remove key from the cache if present"""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
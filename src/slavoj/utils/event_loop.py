@@ -0,0 +1,26 @@
+import asyncio
+from typing import Coroutine, TypeVar
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+T = TypeVar("T")
+
+
+def run(main: Coroutine[None, None, T]) -> T:
+    """
+    Run a coroutine to completion in a new event loop.
+
+    Uses uvloop when it is installed and falls back to the default asyncio loop.
+
+    Args:
+        main: Coroutine to run
+
+    Returns:
+        The coroutine's result
+    """
+    if uvloop is not None:
+        return uvloop.run(main)
+    return asyncio.run(main)
@@ -1,15 +1,63 @@
-from typing import Dict, Any, TypeVar, List, Union
+import asyncio
+from typing import Dict, Any, List, Optional
 
-T = TypeVar('T')
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
 
+# GridFS bucket holding the extracted text of each book
+BOOK_CONTENT_BUCKET = "book_content"
 
-def strip_mongo_id(data: Union[Dict[str, Any], List[Dict[str, Any]]]) -> Union[
-    Dict[str, Any], List[Dict[str, Any]]]:
-    """Remove MongoDB _id field from document or list of documents"""
-    if isinstance(data, list):
-        return [strip_mongo_id(item) for item in data]
 
-    if isinstance(data, dict):
-        return {k: v for k, v in data.items() if k != '_id'}
+# Indexes backing the application's queries, keyed by collection
+INDEXES: Dict[str, List[IndexModel]] = {
+    "authors": [
+        IndexModel([("name", ASCENDING)], unique=True),
+        # A WhatsApp number can only belong to one author
+        IndexModel([("whatsapp_number", ASCENDING)], unique=True, sparse=True),
+    ],
+    # Also serves lookups by author alone through its prefix
+    "books": [
+        IndexModel(
+            [("author", ASCENDING), ("title", ASCENDING)],
+            unique=True,
+            name="author_title",
+        )
+    ],
+    "conversations": [IndexModel([("id", ASCENDING)], unique=True)],
+    "messages": [
+        IndexModel([("conversation_id", ASCENDING), ("timestamp", ASCENDING)])
+    ],
+}
 
-    return data
\ No newline at end of file
+
+async def ensure_indexes(
+    db: AsyncIOMotorDatabase, collections: Optional[List[str]] = None
+) -> None:
+    """
+    Create the indexes in INDEXES if they don't exist yet.
+
+    Args:
+        db: Database to create the indexes in
+        collections: Only create the indexes of these collections, all by default
+    """
+    await asyncio.gather(
+        *[
+            db[collection].create_indexes(indexes)
+            for collection, indexes in INDEXES.items()
+            if collections is None or collection in collections
+        ]
+    )
+
+
+def create_client(connection_string: str, **options: Any) -> AsyncIOMotorClient:
+    """
+    Create a Motor client for the given connection string.
+
+    The client owns a connection pool, create one per process and reuse it
+    rather than creating a client per operation.
+
+    Args:
+        connection_string: MongoDB connection URI
+        **options: Additional client options passed to Motor
+    """
+    return AsyncIOMotorClient(connection_string, **options)
@@ -0,0 +1,67 @@
+import json
+from typing import Any, Dict
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def load_json_file(file_path: str) -> Any:
+    """
+    Load and parse a JSON file.
+
+    Uses orjson when it is installed and falls back to the standard library.
+
+    Args:
+        file_path: Path to the JSON file
+
+    Returns:
+        The parsed JSON document
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_json(data: str) -> Any:
+    """Parse a JSON string, using orjson if available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_json(obj: Any) -> str:
+    """Serialise an object to a compact JSON string, using orjson if available."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def load_json_object(file_path: str, key: str) -> Dict[str, Any]:
+    """
+    Load a single top-level object from a JSON file.
+
+    With ijson installed the file is streamed and only the requested object is
+    materialised, otherwise the whole document is parsed.
+
+    Args:
+        file_path: Path to the JSON file
+        key: Top-level key of the object to load
+
+    Returns:
+        The object stored under key, or an empty dict if it is missing
+    """
+    if ijson is not None:
+        with open(file_path, "rb") as f:
+            return dict(ijson.kvitems(f, key, use_float=True))
+
+    return load_json_file(file_path).get(key, {})
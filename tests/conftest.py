@@ -0,0 +1,186 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import pytest
+
+from slavoj.core.config import ProcessingConfig
+from slavoj.core.exceptions import LLMError
+from slavoj.domain.models import (
+    Author,
+    Book,
+    ConversationContext,
+    GeneratedResponse,
+    Message,
+    MessageType,
+)
+from slavoj.services.book_processor import BookProcessor
+
+
+class FakeDatabase:
+    """Serves a fixed list of books and keeps conversations in memory"""
+
+    def __init__(self):
+        self.books: List[Book] = []
+        self.reads: List[str] = []
+        self.conversations: Dict[str, List[Message]] = {}
+        self.messages: List[Message] = []
+
+    async def get_books_by_author(self, author: str) -> List[Book]:
+        self.reads.append(author)
+        # Yield like a real query so concurrent callers interleave
+        await asyncio.sleep(0)
+        return self.books
+
+    async def get_author_by_whatsapp(self, whatsapp_number: str) -> Author:
+        return Author(
+            name="author",
+            whatsapp_number=whatsapp_number,
+            books=self.books,
+            conversation_style={},
+        )
+
+    async def get_conversation_context(
+        self, conversation_id: str
+    ) -> Optional[ConversationContext]:
+        messages = self.conversations.get(conversation_id)
+        if messages is None:
+            return None
+        return ConversationContext(
+            id=conversation_id,
+            user_id="user",
+            author_id="author",
+            messages=list(messages),
+        )
+
+    async def store_conversation(self, conversation: ConversationContext) -> bool:
+        if conversation.id in self.conversations:
+            return False
+        self.conversations[conversation.id] = list(conversation.messages)
+        return True
+
+    async def update_conversation(self, conversation: ConversationContext) -> bool:
+        # Take a while like a write round trip
+        await asyncio.sleep(0.01)
+        self.conversations[conversation.id].extend(conversation.unsaved_messages)
+        conversation.mark_saved()
+        return True
+
+    async def store_message(self, message: Message) -> bool:
+        self.messages.append(message)
+        return True
+
+
+class FakeLLM:
+    """Answers with the book titles and tracks the requests in flight"""
+
+    def __init__(self):
+        self.batch_size = 8
+        self.fail_batch = False
+        # Number of books a batch answers, like a truncated output, None for all
+        self.batch_answered: Optional[int] = None
+        self.batch_calls = 0
+        self.book_calls = 0
+        self.small_talk_calls = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def max_batch_size(self) -> int:
+        return self.batch_size
+
+    async def generate_response(
+        self, book_title: str, book_content: str, conversation_context, query: str
+    ) -> GeneratedResponse:
+        self.book_calls += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+        return GeneratedResponse(book_title, f"book: {book_title}", 0.0)
+
+    async def aggregate_responses(
+        self, responses: List[GeneratedResponse], query: str
+    ) -> str:
+        return " ".join(response.content for response in responses)
+
+    async def generate_small_talk(self, conversation_context, query: str) -> str:
+        self.small_talk_calls += 1
+        return "small talk"
+
+    async def generate_responses_batch(
+        self, books: List[Book], conversation_context, query: str
+    ) -> List[GeneratedResponse]:
+        self.batch_calls += 1
+        if self.fail_batch:
+            raise LLMError("Truncated batch output")
+        return [
+            GeneratedResponse(b.title, f"batch: {b.title}", 0.0)
+            for b in books[: self.batch_answered]
+        ]
+
+
+@pytest.fixture
+def make_message():
+    """Build a user message in the test conversation"""
+
+    def make(content: str) -> Message:
+        return Message(
+            content=content,
+            timestamp=datetime(2025, 1, 1),
+            sender_id="user",
+            recipient_id="author",
+            conversation_id="conversation",
+            message_type=MessageType.USER,
+        )
+
+    return make
+
+
+@pytest.fixture
+def make_context():
+    """Build the test conversation holding the given messages"""
+
+    def make(messages: Iterable[Message] = ()) -> ConversationContext:
+        return ConversationContext(
+            id="conversation",
+            user_id="user",
+            author_id="author",
+            messages=list(messages),
+        )
+
+    return make
+
+
+@pytest.fixture
+def make_books():
+    """Build books by the test author with the given content"""
+
+    def make(count: int, content: str = "text") -> List[Book]:
+        return [
+            Book(title=f"Book {i}", content=content, author="author")
+            for i in range(count)
+        ]
+
+    return make
+
+
+@pytest.fixture
+def db() -> FakeDatabase:
+    return FakeDatabase()
+
+
+@pytest.fixture
+def llm() -> FakeLLM:
+    return FakeLLM()
+
+
+@pytest.fixture
+def make_processor(db: FakeDatabase, llm: FakeLLM):
+    """Build a BookProcessor over the fake database and LLM"""
+
+    def make(max_concurrent_books: int = 4) -> BookProcessor:
+        return BookProcessor(db, llm, ProcessingConfig(max_concurrent_books, 5, 5))
+
+    return make
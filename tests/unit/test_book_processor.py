@@ -0,0 +1,129 @@
+import asyncio
+
+from slavoj.services.book_processor import BookProcessor
+
+AUTHOR = "author"
+
+
+def run_query(processor_factory, make_context, query="Why?"):
+    """Process one query with a processor built inside the event loop"""
+
+    async def run():
+        return await processor_factory().process_query(query, AUTHOR, make_context())
+
+    return asyncio.run(run())
+
+
+def test_concurrency_limit_is_shared_across_queries(
+    db, llm, make_books, make_context, make_processor
+):
+    # A single book per query is processed on its own
+    db.books = make_books(1)
+
+    async def run():
+        processor = make_processor(max_concurrent_books=2)
+        return await asyncio.gather(
+            *[processor.process_query("Why?", AUTHOR, make_context()) for _ in range(6)]
+        )
+
+    results = asyncio.run(run())
+
+    assert [len(responses) for responses in results] == [1] * 6
+    assert llm.book_calls == 6
+    assert llm.peak_in_flight == 2
+
+
+def test_small_author_is_answered_with_one_batch(
+    db, llm, make_books, make_context, make_processor
+):
+    db.books = make_books(3)
+
+    responses = run_query(make_processor, make_context)
+
+    assert [r.content for r in responses] == [
+        "batch: Book 0",
+        "batch: Book 1",
+        "batch: Book 2",
+    ]
+    assert llm.batch_calls == 1
+    assert llm.book_calls == 0
+
+
+def test_batch_is_skipped_above_llm_batch_size(
+    db, llm, make_books, make_context, make_processor
+):
+    llm.batch_size = 2
+    db.books = make_books(3)
+
+    responses = run_query(make_processor, make_context)
+
+    assert len(responses) == 3
+    assert llm.batch_calls == 0
+
+
+def test_batch_is_skipped_above_content_limit(
+    db, llm, make_books, make_context, make_processor
+):
+    db.books = make_books(2, "x" * (BookProcessor.BATCH_CONTENT_LIMIT // 2 + 1))
+
+    run_query(make_processor, make_context)
+
+    assert llm.batch_calls == 0
+    assert llm.book_calls == 2
+
+
+def test_failed_batch_falls_back_to_books_and_is_remembered(
+    db, llm, make_books, make_context, make_processor
+):
+    llm.fail_batch = True
+    db.books = make_books(3)
+
+    async def run():
+        processor = make_processor()
+        first = await processor.process_query("Why?", AUTHOR, make_context())
+        second = await processor.process_query("How?", AUTHOR, make_context())
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert [r.content for r in first] == [
+        "book: Book 0",
+        "book: Book 1",
+        "book: Book 2",
+    ]
+    assert len(second) == 3
+    # The second query goes straight to per-book requests
+    assert llm.batch_calls == 1
+    assert llm.book_calls == 6
+
+
+def test_books_missing_from_a_batch_are_processed_on_their_own(
+    db, llm, make_books, make_context, make_processor
+):
+    llm.batch_answered = 2
+    db.books = make_books(3)
+
+    responses = run_query(make_processor, make_context)
+
+    assert [r.content for r in responses] == [
+        "batch: Book 0",
+        "batch: Book 1",
+        "book: Book 2",
+    ]
+    assert llm.book_calls == 1
+
+
+def test_books_are_read_once_for_concurrent_queries(
+    db, make_books, make_context, make_processor
+):
+    db.books = make_books(2)
+
+    async def run():
+        processor = make_processor()
+        await asyncio.gather(
+            *[processor.process_query("Why?", AUTHOR, make_context()) for _ in range(3)]
+        )
+
+    asyncio.run(run())
+
+    assert db.reads == [AUTHOR]
@@ -0,0 +1,42 @@
+from slavoj.utils import cache
+from slavoj.utils.cache import TTLCache
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    entries = TTLCache(maxsize=2, ttl=10)
+
+    entries.set("a", 1)
+    now[0] += 9
+    assert entries.get("a") == 1
+
+    now[0] += 1
+    assert entries.get("a") is None
+    assert entries.get("a", "missing") == "missing"
+    assert len(entries) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    entries = TTLCache(maxsize=2, ttl=60)
+
+    entries.set("a", 1)
+    entries.set("b", 2)
+    entries.get("a")
+    entries.set("c", 3)
+
+    assert entries.get("b") is None
+    assert entries.get("a") == 1
+    assert entries.get("c") == 3
+    assert len(entries) == 2
+
+
+def test_popped_entries_are_removed():
+    entries = TTLCache(maxsize=2, ttl=60)
+    entries.set("a", 1)
+
+    entries.pop("a")
+    entries.pop("missing")
+
+    assert entries.get("a") is None
+    assert len(entries) == 0
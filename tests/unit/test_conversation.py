@@ -0,0 +1,130 @@
+import asyncio
+import dataclasses
+from types import SimpleNamespace
+
+import pytest
+
+from slavoj.infrastructure.database.mongodb import MongoDB
+from slavoj.services.conversation import ConversationManager
+
+
+class FakeConversations:
+    def __init__(self):
+        self.updates = []
+
+    async def update_one(self, query, update):
+        self.updates.append((query, update))
+        return SimpleNamespace(modified_count=1)
+
+
+def test_added_messages_are_unsaved_until_marked_saved(make_message, make_context):
+    context = make_context([make_message("loaded")])
+
+    context.add_message(make_message("first"))
+    context.add_message(make_message("second"))
+
+    assert [m.content for m in context.unsaved_messages] == ["first", "second"]
+    assert len(context.messages) == 3
+
+    context.mark_saved()
+
+    assert context.unsaved_messages == []
+    assert len(context.messages) == 3
+
+
+def test_recent_history_follows_added_messages(make_message, make_context):
+    context = make_context([make_message("first")])
+    assert context.recent_history() == "user: first"
+
+    context.add_message(make_message("second"))
+
+    assert context.recent_history() == "user: first\nuser: second"
+    assert context.recent_history(count=1) == "user: second"
+
+
+def test_update_conversation_pushes_only_unsaved_messages(make_message, make_context):
+    conversations = FakeConversations()
+    context = make_context([make_message("loaded")])
+    context.add_message(make_message("new"))
+
+    async def update_twice():
+        # The client connects lazily, no server is contacted
+        db = MongoDB("mongodb://localhost:27017", "test")
+        db.db = SimpleNamespace(conversations=conversations)
+        assert await db.update_conversation(context)
+        assert context.unsaved_messages == []
+        await db.update_conversation(context)
+        db.client.close()
+
+    asyncio.run(update_twice())
+
+    query, update = conversations.updates[0]
+    assert query == {"id": "conversation"}
+    assert update["$push"]["messages"]["$slice"] == -MongoDB.MAX_EMBEDDED_MESSAGES
+    assert [m["content"] for m in update["$push"]["messages"]["$each"]] == ["new"]
+    assert update["$push"]["messages"]["$each"][0]["message_type"] == "user"
+
+    # Nothing new to append, only the conversation's fields are set
+    _, update = conversations.updates[1]
+    assert "$push" not in update
+    assert set(update["$set"]) == {"last_updated", "metadata"}
+
+
+def test_follow_up_reads_the_previous_exchange(
+    db, llm, make_books, make_message, make_processor
+):
+    db.books = make_books(1)
+
+    async def run():
+        manager = ConversationManager(db, make_processor(), llm)
+        # Sent again as soon as the first reply is returned, before the
+        # exchange has been written
+        await manager.process_message(make_message("What is ideology?"))
+        await manager.process_message(make_message("What is ideology?"))
+        await manager.close()
+
+    asyncio.run(run())
+
+    # The repeat is a follow-up rather than an opening message, so it is
+    # answered from the books instead of the response cache
+    assert llm.book_calls == 2
+    assert [m.content for m in db.conversations["conversation"]] == [
+        "What is ideology?",
+        "book: Book 0",
+        "What is ideology?",
+        "book: Book 0",
+    ]
+
+
+def test_small_talk_replies_are_not_cached(db, llm, make_message, make_processor):
+    async def run():
+        manager = ConversationManager(db, make_processor(), llm)
+        for conversation_id in ("first", "second"):
+            await manager.process_message(
+                dataclasses.replace(make_message("hi"), conversation_id=conversation_id)
+            )
+        await manager.close()
+
+    asyncio.run(run())
+
+    assert llm.small_talk_calls == 2
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["hi", "Hello!", "  thank   you ", "Good morning.", "ok", "??", ":)", "no"],
+)
+def test_small_talk_is_detected(query):
+    manager = ConversationManager(db=None, book_processor=None, llm=None)
+
+    assert manager._is_small_talk(query)
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["Why?", "yes", "What is ideology?", "hi, what do you think of Hegel?", "Lacan"],
+)
+def test_questions_are_not_small_talk(query):
+    manager = ConversationManager(db=None, book_processor=None, llm=None)
+
+    assert not manager._is_small_talk(query)